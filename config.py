@@ -6,4 +6,44 @@ class Config:
     LOG_FOLDER = 'logs'
     SUBFOLDERS = ['segments', 'randomized', 'processed', 'duplicate_voice', 'tts']
     GCS_CREDENTIALS_FILE = '/home/marvin/modern-heading-280420-358a869141f1.json'
-    S3_BUCKET_NAME = os.getenv('S3_BUCKET_NAME', 'facebook-videos-bucket')
\ No newline at end of file
+    S3_BUCKET_NAME = os.getenv('S3_BUCKET_NAME', 'facebook-videos-bucket')
+    FFPROBE_BINARY = os.getenv('FFPROBE_BINARY', 'ffprobe')  # Del sistema (apt install ffmpeg); imageio-ffmpeg no lo trae
+    SEGMENT_WORKERS = int(os.getenv('SEGMENT_WORKERS', os.cpu_count() or 1))
+    BUMPER_CACHE_FOLDER = os.getenv('BUMPER_CACHE_FOLDER', os.path.join(os.path.dirname(__file__), 'cache', 'bumpers'))
+    BUMPER_CACHE_MAX_BYTES = int(os.getenv('BUMPER_CACHE_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+    MEDIA_PROBE_CACHE_FILE = os.getenv('MEDIA_PROBE_CACHE_FILE', os.path.join(os.path.dirname(__file__), 'cache', 'media_probe.json'))
+    TRANSCRIBE_MAX_CONCURRENT_POLLS = int(os.getenv('TRANSCRIBE_MAX_CONCURRENT_POLLS', 8))
+    TRANSCRIBE_POLL_MIN_INTERVAL = float(os.getenv('TRANSCRIBE_POLL_MIN_INTERVAL', 5))
+    TRANSCRIBE_POLL_MAX_INTERVAL = float(os.getenv('TRANSCRIBE_POLL_MAX_INTERVAL', 30))
+    TRANSCRIBE_POLL_MAX_NETWORK_ERRORS = int(os.getenv('TRANSCRIBE_POLL_MAX_NETWORK_ERRORS', 5))
+    # Escribir en tmpfs (no en /tmp) las salidas que se suben a S3 y se borran; se suben al terminar de escribirse
+    ENCODE_IN_MEMORY = os.getenv('ENCODE_IN_MEMORY', os.getenv('S3_STREAM_UPLOADS', '0')) == '1'
+    MEMORY_OUTPUT_FOLDER = os.getenv('MEMORY_OUTPUT_FOLDER', '/dev/shm')
+    # Espacio libre mínimo en MEMORY_OUTPUT_FOLDER para usarlo (el /dev/shm de Docker es de 64 MB); si no, /tmp
+    MEMORY_OUTPUT_MIN_FREE = int(os.getenv('MEMORY_OUTPUT_MIN_FREE', 1024 * 1024 * 1024))
+    S3_RANGE_READS = os.getenv('S3_RANGE_READS', '0') == '1'  # Decodificar los videos fuente desde S3 sin descargarlos
+    S3_RANGE_BLOCK_SIZE = int(os.getenv('S3_RANGE_BLOCK_SIZE', 4 * 1024 * 1024))
+    S3_RANGE_CACHE_BLOCKS = int(os.getenv('S3_RANGE_CACHE_BLOCKS', 16))
+    S3_RANGE_READAHEAD = int(os.getenv('S3_RANGE_READAHEAD', 4))
+    S3_RANGE_RETRIES = int(os.getenv('S3_RANGE_RETRIES', 3))  # Intentos por bloque antes de dar el render por fallido
+    S3_MANIFEST_FOLDER = os.getenv('S3_MANIFEST_FOLDER', os.path.join(os.path.dirname(__file__), 'cache', 's3_manifests'))
+    S3_MANIFEST_FULL_REFRESH = int(os.getenv('S3_MANIFEST_FULL_REFRESH', 6 * 3600))  # Segundos entre listados completos
+    # Para prefijos cuyas claves nuevas no van siempre al final (lo normal en este proyecto)
+    S3_MANIFEST_UNORDERED_FULL_REFRESH = int(os.getenv('S3_MANIFEST_UNORDERED_FULL_REFRESH', 600))
+    TRANSCRIPT_CACHE_FOLDER = os.getenv('TRANSCRIPT_CACHE_FOLDER', os.path.join(os.path.dirname(__file__), 'cache', 'transcripts'))
+    S3_MULTIPART_THRESHOLD = int(os.getenv('S3_MULTIPART_THRESHOLD', 64 * 1024 * 1024))
+    S3_MULTIPART_CHUNKSIZE = int(os.getenv('S3_MULTIPART_CHUNKSIZE', 16 * 1024 * 1024))
+    S3_MAX_CONCURRENCY = int(os.getenv('S3_MAX_CONCURRENCY', 10))
+    S3_MAX_BANDWIDTH = int(os.getenv('S3_MAX_BANDWIDTH', 0))  # Bytes por segundo; 0 = sin límite
+    TRANSCRIPT_CACHE_S3_PREFIX = os.getenv('TRANSCRIPT_CACHE_S3_PREFIX', '')  # Vacío = solo caché local
+    FB_GRAPH_URL = os.getenv('FB_GRAPH_URL', 'https://graph.facebook.com/v20.0')
+    FB_UPLOAD_CHUNK_SIZE = int(os.getenv('FB_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+    FB_UPLOAD_MAX_RETRIES = int(os.getenv('FB_UPLOAD_MAX_RETRIES', 5))
+    FB_UPLOAD_RETRY_WAIT = float(os.getenv('FB_UPLOAD_RETRY_WAIT', 2))  # Segundos antes del primer reintento; se duplica en cada uno
+    FB_UPLOAD_STATE_FOLDER = os.getenv('FB_UPLOAD_STATE_FOLDER', os.path.join(os.path.dirname(__file__), 'cache', 'fb_uploads'))
+    PUBLISH_WORKERS = int(os.getenv('PUBLISH_WORKERS', 4))  # Subidas simultáneas a Facebook
+    PUBLISH_RATE_STATE_FILE = os.getenv('PUBLISH_RATE_STATE_FILE', os.path.join(os.path.dirname(__file__), 'cache', 'publish_rate.json'))
+    FB_REELS_PER_PERIOD = int(os.getenv('FB_REELS_PER_PERIOD', 30))  # Cupo de Reels por página...
+    FB_REELS_PERIOD = int(os.getenv('FB_REELS_PERIOD', 24 * 3600))  # ...en este periodo (segundos)
+    ASSET_CACHE_FOLDER = os.getenv('ASSET_CACHE_FOLDER', os.path.join(os.path.dirname(__file__), 'cache', 'assets'))
+    ASSET_CACHE_MAX_BYTES = int(os.getenv('ASSET_CACHE_MAX_BYTES', 5 * 1024 * 1024 * 1024))
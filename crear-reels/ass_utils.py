@@ -0,0 +1,104 @@
+import subprocess
+from functools import lru_cache
+from moviepy.config import get_setting
+
+FONT_NAME = 'Arial'
+FONT_SIZE = 56
+# Colores ASS en formato &HAABBGGRR
+TEXT_COLOUR = '&H00FFFFFF'
+HIGHLIGHT_COLOUR = '&H00800080'
+HIDDEN = '&HFF&'
+
+@lru_cache(maxsize=1)
+def ffmpeg_supports_subtitles():
+    """Indica si el ffmpeg configurado en moviepy tiene el filtro 'subtitles' (libass)."""
+    try:
+        result = subprocess.run([get_setting("FFMPEG_BINARY"), '-hide_banner', '-filters'],
+                                capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    return any(line.split()[1:2] == ['subtitles'] for line in result.stdout.splitlines())
+
+def subtitles_filter(ass_file):
+    # Escapar la ruta para la sintaxis de filtros de ffmpeg
+    escaped = ass_file.replace('\\', '\\\\').replace(':', '\\:').replace("'", "\\'")
+    return f"subtitles={escaped}"
+
+def format_ass_timestamp(seconds):
+    centiseconds = int(round(max(seconds, 0) * 100))
+    hours, remainder = divmod(centiseconds, 360000)
+    minutes, remainder = divmod(remainder, 6000)
+    secs, centis = divmod(remainder, 100)
+    return f"{hours}:{minutes:02}:{secs:02}.{centis:02}"
+
+def escape_ass_text(text):
+    return text.replace('\\', '\\\\').replace('{', '(').replace('}', ')')
+
+def group_words(words, max_words, max_gap=0.6):
+    """Agrupa palabras consecutivas en frases de hasta max_words, cortando en pausas largas."""
+    groups, current = [], []
+    for word in words:
+        if current and (len(current) >= max_words or word['start'] - current[-1]['end'] > max_gap):
+            groups.append(current)
+            current = []
+        current.append(word)
+    if current:
+        groups.append(current)
+    return groups
+
+def words_to_ass(words, ass_file, frame_size, offset=0.0, max_words=1):
+    """
+    Genera un archivo ASS con resaltado karaoke por palabra a partir de los tiempos
+    de Transcribe (ver parse_word_timings). Cada palabra activa se dibuja en blanco
+    sobre una caja morada, como el renderizado con OpenCV; el resto de la frase en
+    blanco sin caja. offset desplaza todos los tiempos (p. ej. la duración del hook).
+    """
+    width, height = frame_size
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {width}",
+        f"PlayResY: {height}",
+        "WrapStyle: 0",
+        "ScaledBorderAndShadow: yes",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, "
+        "Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, "
+        "Shadow, Alignment, MarginL, MarginR, MarginV, Encoding",
+        f"Style: Texto,{FONT_NAME},{FONT_SIZE},{TEXT_COLOUR},{TEXT_COLOUR},{HIGHLIGHT_COLOUR},"
+        f"{HIGHLIGHT_COLOUR},0,0,0,0,100,100,0,0,3,8,0,5,{int(width * 0.1)},{int(width * 0.1)},0,1",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ]
+
+    for group in group_words(words, max_words):
+        phrase_start = group[0]['start'] + offset
+        phrase_end = group[-1]['end'] + offset
+        texts = [escape_ass_text(word['content']) for word in group]
+
+        if len(group) > 1:
+            # Capa base: la frase completa en blanco, con la caja transparente
+            base = ' '.join(texts)
+            lines.append(
+                f"Dialogue: 0,{format_ass_timestamp(phrase_start)},{format_ass_timestamp(phrase_end)},"
+                f"Texto,,0,0,0,,{{\\3a{HIDDEN}\\4a{HIDDEN}}}{base}")
+
+        # Capa superior: solo la palabra activa visible, con su caja, en la misma posición
+        for index, word in enumerate(group):
+            parts = []
+            for other_index, text in enumerate(texts):
+                if other_index == index:
+                    parts.append(f"{{\\alpha&H00&}}{text}")
+                else:
+                    parts.append(f"{{\\alpha{HIDDEN}}}{text}")
+            # El resaltado dura hasta que empieza la siguiente palabra de la frase
+            end = group[index + 1]['start'] if index + 1 < len(group) else word['end']
+            lines.append(
+                f"Dialogue: 1,{format_ass_timestamp(word['start'] + offset)},{format_ass_timestamp(end + offset)},"
+                f"Texto,,0,0,0,,{' '.join(parts)}")
+
+    with open(ass_file, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    return ass_file
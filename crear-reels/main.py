@@ -1,7 +1,18 @@
 import os
+import sys
 import boto3
-from s3_utils import download_from_s3, upload_to_s3
-from video_processing import process_single_reel
+
+# Permite importar los módulos compartidos de la raíz del repositorio (modules/, config.py)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from modules.media_probe import MediaProbe
+from modules.s3_listing import S3Listing
+from modules.s3_range_reader import S3RangeServer
+from s3_utils import download_from_s3, upload_to_s3, acquire_asset
+from video_processing import (transcribe_fragment, render_fragment, upload_fragment, discard_transcript,
+                              discard_fragment, transcript_cache)
+from pipeline import FragmentPipeline
 from pysrt import open as open_srt
 from transcription_utils import get_bucket_region
 from moviepy.editor import VideoFileClip
@@ -17,6 +28,11 @@ LOCAL_FOLDER = '/tmp'
 OUTPUT_FOLDER = 'reels'
 FRAGMENT_LOG_FILE = 'processed_fragments.log'
 FRAGMENT_DURATION = 90
+SUBTITLE_BACKEND = os.getenv('SUBTITLE_BACKEND', 'opencv')  # 'opencv' o 'ass'
+TRANSCRIPTION_MODE = os.getenv('TRANSCRIPTION_MODE', 'fragment')  # 'fragment' o 'voice' (una vez por archivo de voz)
+TRANSCRIPTION_BACKEND = os.getenv('TRANSCRIPTION_BACKEND', 'aws')  # 'aws' o 'local' (faster-whisper en CPU)
+TRANSCRIBE_AHEAD = int(os.getenv('TRANSCRIBE_AHEAD', 2))  # Fragmentos transcritos por delante del render
+UPLOAD_QUEUE_SIZE = int(os.getenv('UPLOAD_QUEUE_SIZE', 2))  # Reels renderizados esperando subida
 
 def load_processed_fragments():
     processed_fragments = {}
@@ -43,65 +59,112 @@ def save_processed_fragment(video_filename, fragment_index, complete=False):
         log_file.write(f"{video_filename},{fragment_index},{status}\n")
 
 def main():
-    s3_video_objects = s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=VIDEO_FOLDER).get('Contents', [])
-    s3_music_objects = s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=BACKGROUND_MUSIC_FOLDER).get('Contents', [])
-    s3_hooks_objects = s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=HOOKS_FOLDER).get('Contents', [])
-    s3_voices_objects = s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=AUDIO_FOLDER).get('Contents', [])
-
-    video_files = [obj['Key'] for obj in s3_video_objects if obj['Key'].endswith('.mp4')]
-    music_files = [obj['Key'] for obj in s3_music_objects if obj['Key'].endswith('.mp3') or obj['Key'].endswith('.wav')]
-    hooks_files = [obj['Key'] for obj in s3_hooks_objects if obj['Key'].endswith('.mp4')]
-    voices_files = [obj['Key'] for obj in s3_voices_objects if obj['Key'].endswith('.mp3') or obj['Key'].endswith('.wav')]
+    listing = S3Listing(BUCKET_NAME, s3)
+    video_files = listing.keys(VIDEO_FOLDER, suffixes=('.mp4',))
+    music_files = listing.keys(BACKGROUND_MUSIC_FOLDER, suffixes=('.mp3', '.wav'))
+    hooks_files = listing.keys(HOOKS_FOLDER, suffixes=('.mp4',))
+    voices_files = listing.keys(AUDIO_FOLDER, suffixes=('.mp3', '.wav'))
 
     if not video_files or not music_files or not hooks_files or not voices_files:
         print("Missing video, music, hook, or voice files.")
         return
 
     processed_fragments = load_processed_fragments()
+    media_probe = MediaProbe(s3_client=s3)
+    range_server = S3RangeServer(BUCKET_NAME) if Config.S3_RANGE_READS else None
+
+    try:
+        for video_s3_key in video_files:
+            video_filename = os.path.basename(video_s3_key)
+            local_video_path = os.path.join(LOCAL_FOLDER, video_filename)
+
+            if video_filename in processed_fragments and processed_fragments[video_filename]['complete']:
+                print(f"Video {video_filename} already fully processed. Skipping...")
+                continue
+
+            # Comprobar con la cabecera del video en S3 si queda algo por procesar. Solo sirve
+            # para no descargarlo: el video se marca completo con la duración del lector real
+            try:
+                video_duration = media_probe.probe_s3(BUCKET_NAME, video_s3_key)['duration']
+            except Exception as e:
+                if S3Listing.is_missing(e):
+                    # Borrado desde el último listado completo: que no vuelva a aparecer
+                    listing.forget(VIDEO_FOLDER, video_s3_key)
+                    print(f"Video {video_filename} no longer exists in S3. Skipping...")
+                    continue
+                # Sin ffprobe o con una cabecera ilegible se sigue como antes: se abre el
+                # video y la duración sale del lector de moviepy
+                print(f"Could not probe {video_filename} ({e}). Opening it to read the duration...")
+                video_duration = None
+            start_time = processed_fragments.get(video_filename, {}).get('last_fragment', 0) * FRAGMENT_DURATION
+            fragment_index = processed_fragments.get(video_filename, {}).get('last_fragment', 0) + 1
+
+            if video_duration is not None and start_time >= video_duration:
+                print(f"Video {video_filename} has no fragments left to process. Skipping download...")
+                continue
 
-    for video_s3_key in video_files:
-        video_filename = os.path.basename(video_s3_key)
-        local_video_path = os.path.join(LOCAL_FOLDER, video_filename)
-
-        if video_filename in processed_fragments and processed_fragments[video_filename]['complete']:
-            print(f"Video {video_filename} already fully processed. Skipping...")
-            continue
-
-        if not os.path.exists(local_video_path):
-            download_from_s3(video_s3_key, local_video_path)
-
-        # Descargar el primer archivo de música
-        music_s3_key = music_files[0]
-        local_music_path = os.path.join(LOCAL_FOLDER, os.path.basename(music_s3_key))
-
-        if not os.path.exists(local_music_path):
-            download_from_s3(music_s3_key, local_music_path)
-
-        start_time = processed_fragments.get(video_filename, {}).get('last_fragment', 0) * FRAGMENT_DURATION
-        fragment_index = processed_fragments.get(video_filename, {}).get('last_fragment', 0) + 1
-
-        while start_time < VideoFileClip(local_video_path).duration:
-            # Procesar un solo reel (fragmento de 90 segundos)
-            fragment_filename, fragment_s3_key = process_single_reel(
-                video_path=local_video_path,
-                video_filename=video_filename,
-                start_time=start_time,
-                fragment_index=fragment_index,
-                music_path=local_music_path,
-                hooks=hooks_files,
-                voices=voices_files,  # Se incluye el argumento 'voices'
-                bucket_name=BUCKET_NAME
-            )
-
-            # Guardar el progreso del fragmento procesado
-            save_processed_fragment(video_filename, fragment_index)
-
-            start_time += FRAGMENT_DURATION
-            fragment_index += 1
-
-        save_processed_fragment(video_filename, fragment_index - 1, complete=True)
-        os.remove(local_video_path)
-        os.remove(local_music_path)
+            music_lease = None
+            try:
+                video_source = local_video_path
+                if range_server is not None:
+                    # ffmpeg lee el índice y salta por rangos al primer fragmento pendiente:
+                    # reanudar en el fragmento 40 no obliga a bajar los 39 anteriores
+                    video_source = range_server.url(video_s3_key)
+                elif not os.path.exists(local_video_path):
+                    download_from_s3(video_s3_key, local_video_path)
+
+                # Si falla la lectura por rangos, el render lo detecta antes de subir el reel
+                check_source = (lambda: range_server.check(video_s3_key)) if range_server is not None else None
+
+                # Usar el primer archivo de música (desde la caché de assets)
+                music_s3_key = music_files[0]
+                music_lease = acquire_asset(music_s3_key)
+                local_music_path = music_lease.path
+
+                # Un solo lector por video: avanza por los fragmentos y se cierra al terminar.
+                # El audio de la fuente no se usa (se reemplaza por voz y música).
+                # Mientras se renderiza un fragmento, los siguientes se transcriben y el anterior se sube.
+                with VideoFileClip(video_source, audio=False) as video_clip:
+                    fragments = []
+                    while start_time < video_clip.duration:
+                        fragments.append((fragment_index, start_time))
+                        start_time += FRAGMENT_DURATION
+                        fragment_index += 1
+
+                    pipeline = FragmentPipeline(transcribe_ahead=TRANSCRIBE_AHEAD, upload_queue_size=UPLOAD_QUEUE_SIZE)
+                    pipeline.run(
+                        fragments,
+                        transcribe=lambda index, start: transcribe_fragment(
+                            video_filename, start, index, voices_files, BUCKET_NAME,
+                            transcription_mode=TRANSCRIPTION_MODE, transcription_backend=TRANSCRIPTION_BACKEND),
+                        render=lambda index, start, transcript: render_fragment(
+                            video_clip, video_filename, start, index, local_music_path, hooks_files,
+                            transcript, subtitle_backend=SUBTITLE_BACKEND, direct_upload=Config.ENCODE_IN_MEMORY,
+                            check_source=check_source),
+                        # Con la salida en memoria el reel ya está en S3 al terminar el render
+                        upload=(lambda result: result) if Config.ENCODE_IN_MEMORY else upload_fragment,
+                        # Guardar el progreso del fragmento procesado, en orden
+                        on_uploaded=lambda index, result: save_processed_fragment(video_filename, index),
+                        # Si algo falla, soltar las voces y borrar los reels que no se llegaron a subir
+                        discard_transcript=discard_transcript,
+                        discard_render=discard_fragment,
+                    )
+
+                save_processed_fragment(video_filename, fragment_index - 1, complete=True)
+                if range_server is None:
+                    os.remove(local_video_path)
+            finally:
+                # Soltar la música y los bloques leídos por rangos aunque falle un fragmento
+                if music_lease is not None:
+                    music_lease.release()
+                if range_server is not None:
+                    range_server.release(video_s3_key)
+    finally:
+        # Cerrar el servidor local de rangos aunque el procesamiento falle
+        if range_server is not None:
+            range_server.close()
+
+    print(transcript_cache.summary())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,108 @@
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class FragmentPipeline:
+    """
+    Solapa las tres etapas de cada reel:
+      1. transcribir (hilos): voz + trabajo de Transcribe, hasta transcribe_ahead
+         fragmentos por delante del que se está renderizando;
+      2. renderizar (hilo principal): usa el lector de la fuente, que no es seguro entre hilos;
+      3. subir (un hilo): consume una cola acotada en orden y confirma cada fragmento.
+    Los fragmentos se confirman (on_uploaded) en el mismo orden en que se renderizan,
+    así el log de progreso nunca salta un fragmento.
+    """
+
+    def __init__(self, transcribe_ahead=2, upload_queue_size=2):
+        self.transcribe_ahead = max(1, transcribe_ahead)
+        self.upload_queue_size = max(1, upload_queue_size)
+
+    def run(self, fragments, transcribe, render, upload, on_uploaded, discard_transcript=None, discard_render=None):
+        """
+        fragments: lista de (fragment_index, start_time).
+        transcribe(index, start) -> transcript o None para saltar el fragmento.
+        render(index, start, transcript) -> ruta local del reel.
+        upload(ruta) -> resultado; on_uploaded(index, resultado) tras cada subida
+        (con resultado None si el fragmento se omitió).
+        Si la ejecución se corta, discard_transcript(transcript) se llama para cada
+        transcripción que no llegó a renderizarse y discard_render(ruta) para cada
+        reel renderizado que no se llegó a subir, para liberar sus recursos.
+        """
+        discard_transcript = discard_transcript or (lambda transcript: None)
+        discard_render = discard_render or (lambda fragment_path: None)
+        upload_queue = queue.Queue(maxsize=self.upload_queue_size)
+        errors = []
+
+        def upload_worker():
+            while True:
+                item = upload_queue.get()
+                if item is None:
+                    return
+                fragment_index, fragment_path = item
+                if errors:
+                    # Tras un fallo de subida no se confirma nada más
+                    if fragment_path is not None:
+                        discard_render(fragment_path)
+                    continue
+                try:
+                    result = upload(fragment_path) if fragment_path is not None else None
+                    on_uploaded(fragment_index, result)
+                except Exception as e:
+                    logger.error(f"Error subiendo el fragmento {fragment_index}: {e}")
+                    errors.append(e)
+
+        uploader = threading.Thread(target=upload_worker, daemon=True)
+        uploader.start()
+
+        pending = []
+        next_to_submit = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.transcribe_ahead) as executor:
+                try:
+                    for fragment_index, start_time in fragments:
+                        # Mantener la ventana de transcripciones adelantadas llena
+                        while next_to_submit < len(fragments) and len(pending) < self.transcribe_ahead:
+                            index, start = fragments[next_to_submit]
+                            pending.append(executor.submit(transcribe, index, start))
+                            next_to_submit += 1
+
+                        transcript = pending.pop(0).result()
+                        if errors:
+                            discard_transcript(transcript)
+                            break
+                        if transcript is None:
+                            # Se confirma igual, en su turno, como hacía el bucle secuencial
+                            logger.warning(f"Fragmento {fragment_index} sin transcripción. Se omite.")
+                            fragment_path = None
+                        else:
+                            try:
+                                fragment_path = render(fragment_index, start_time, transcript)
+                            except BaseException:
+                                discard_transcript(transcript)  # Liberar dos veces es inocuo
+                                raise
+                        upload_queue.put((fragment_index, fragment_path))
+                finally:
+                    # No esperar transcripciones que ya no se van a renderizar; las que ya
+                    # empezaron se liberan en cuanto terminan
+                    for future in pending:
+                        if not future.cancel():
+                            future.add_done_callback(lambda done: self.discard_result(done, discard_transcript))
+        finally:
+            # Dejar que terminen las subidas de lo ya renderizado
+            upload_queue.put(None)
+            uploader.join()
+
+        if errors:
+            raise errors[0]
+
+    @staticmethod
+    def discard_result(future, discard_transcript):
+        if future.cancelled() or future.exception() is not None:
+            return
+        try:
+            discard_transcript(future.result())
+        except Exception as e:
+            logger.error(f"Error liberando una transcripción descartada: {e}")
@@ -1,12 +1,26 @@
-import boto3
+from modules.s3_transfer import s3, download_file, upload_file, upload_output
+from modules.asset_cache import AssetCache
 
-s3 = boto3.client('s3')
 BUCKET_NAME = 'facebook-videos-bucket'
 
+# Hooks, voces y música se reutilizan entre reels: se guardan en disco en vez de borrarlos.
+# Los videos fuente no pasan por aquí: cada uno pesa varios GB y se procesa una sola vez,
+# así que solo desplazaría de la caché a los assets que sí se repiten.
+asset_cache = AssetCache(bucket_name=BUCKET_NAME)
+
 def download_from_s3(s3_key, local_path):
-    s3.download_file(BUCKET_NAME, s3_key, local_path)
-    print(f"Downloaded {s3_key} to {local_path}")
+    download_file(BUCKET_NAME, s3_key, local_path)
 
 def upload_to_s3(local_path, s3_key):
-    s3.upload_file(local_path, BUCKET_NAME, s3_key)
-    print(f"Uploaded {local_path} to {s3_key}")
+    upload_file(local_path, BUCKET_NAME, s3_key)
+
+def upload_output_to_s3(s3_key, produce):
+    """Sube a s3_key lo que produce(ruta) escribe en la carpeta de salidas (ver upload_output)."""
+    upload_output(BUCKET_NAME, s3_key, produce)
+
+def acquire_asset(s3_key, etag=None):
+    """Ruta local de un asset desde la caché (ver AssetCache.acquire); hay que liberarlo."""
+    return asset_cache.acquire(s3_key, etag)
+
+def get_etag(s3_key):
+    return s3.head_object(Bucket=BUCKET_NAME, Key=s3_key)['ETag']
@@ -1,6 +1,17 @@
 import cv2
+import numpy as np
+from functools import lru_cache
 from pysrt import open as open_srt
 
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+FONT_SCALE = 1.6
+THICKNESS = 3
+WORD_SPACING = 20
+# Colores en RGB: se dibuja directamente sobre los frames de moviepy
+TEXT_COLOR = (255, 255, 255)
+HIGHLIGHT_COLOR = (128, 0, 128)
+
+@lru_cache(maxsize=4096)
 def get_text_size(text, font, font_scale, thickness):
     size = cv2.getTextSize(text, font, font_scale, thickness)[0]
     return size
@@ -18,29 +29,6 @@ def split_text(text, max_width, font, font_scale, thickness):
 
     return line1.strip(), line2.strip()
 
-def draw_background(frame, line1, line2, font, font_scale, thickness, elapsed_ratio, text_positions):
-    words_line1 = line1.split()
-    words_line2 = line2.split()
-
-    total_words = len(words_line1) + len(words_line2)
-    word_index = int(elapsed_ratio * total_words)
-
-    if word_index < len(words_line1):
-        word = words_line1[word_index]
-        x, y = text_positions[0]
-        for w in words_line1[:word_index]:
-            x += get_text_size(w, font, font_scale, thickness)[0] + 20
-    else:
-        word = words_line2[word_index - len(words_line1)]
-        x, y = text_positions[1]
-        for w in words_line2[:word_index - len(words_line1)]:
-            x += get_text_size(w, font, font_scale, thickness)[0] + 20
-
-    word_size = get_text_size(word, font, font_scale, thickness)
-    end_x = x + word_size[0]
-    cv2.rectangle(frame, (x - 5, y - word_size[1] - 10), (end_x + 5, y + 10), (128, 0, 128), -1)
-    cv2.putText(frame, word, (x, y), font, font_scale, (255, 255, 255), thickness, cv2.LINE_AA)
-
 def calculate_text_positions(frame_width, frame_height, line1, line2, font, font_scale, thickness):
     text_size_line1 = get_text_size(line1, font, font_scale, thickness)
     text_size_line2 = get_text_size(line2, font, font_scale, thickness)
@@ -50,35 +38,108 @@ def calculate_text_positions(frame_width, frame_height, line1, line2, font, font
     text_y_line2 = (frame_height + text_size_line1[1]) // 2 + 20
     return [(text_x_line1, text_y_line1), (text_x_line2, text_y_line2)]
 
-def add_subtitles(get_frame, t, subtitles):
-    frame = get_frame(t)
-    frame_cv2 = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-
-    frame_height, frame_width, _ = frame_cv2.shape
+@lru_cache(maxsize=1024)
+def get_cue_layout(text, frame_width, frame_height):
+    """
+    Calcula una sola vez por subtítulo la posición (x, y) de cada palabra.
+    El layout no cambia mientras el subtítulo está en pantalla.
+    """
     margin = int(frame_width * 0.1)
     safe_width = frame_width - 2 * margin
-    elapsed_ratio = (t % 2) / 2
-
-    for subtitle in subtitles:
-        if subtitle.start.ordinal <= t * 1000 < subtitle.end.ordinal:
-            font = cv2.FONT_HERSHEY_SIMPLEX
-            font_scale = 1.6
-            thickness = 3
-            line1, line2 = split_text(subtitle.text, safe_width, font, font_scale, thickness)
-            text_positions = calculate_text_positions(frame_width, frame_height, line1, line2, font, font_scale, thickness)
-            draw_background(frame_cv2, line1, line2, font, font_scale, thickness, elapsed_ratio, text_positions)
-            draw_remaining_text(frame_cv2, line1, line2, font, font_scale, thickness, text_positions)
-            break
-
-    return cv2.cvtColor(frame_cv2, cv2.COLOR_BGR2RGB)
-
-def draw_remaining_text(frame_cv2, line1, line2, font, font_scale, thickness, text_positions):
-    x = text_positions[0][0]
-    for word in line1.split():
-        cv2.putText(frame_cv2, word, (x, text_positions[0][1]), font, font_scale, (255, 255, 255), thickness, cv2.LINE_AA)
-        x += get_text_size(word, font, font_scale, thickness)[0] + 20
-
-    x = text_positions[1][0]
-    for word in line2.split():
-        cv2.putText(frame_cv2, word, (x, text_positions[1][1]), font, font_scale, (255, 255, 255), thickness, cv2.LINE_AA)
-        x += get_text_size(word, font, font_scale, thickness)[0] + 20
+    line1, line2 = split_text(text, safe_width, FONT, FONT_SCALE, THICKNESS)
+    text_positions = calculate_text_positions(frame_width, frame_height, line1, line2, FONT, FONT_SCALE, THICKNESS)
+
+    placements = []
+    for line, (x, y) in zip((line1, line2), text_positions):
+        for word in line.split():
+            placements.append((word, x, y))
+            x += get_text_size(word, FONT, FONT_SCALE, THICKNESS)[0] + WORD_SPACING
+    return tuple(placements)
+
+@lru_cache(maxsize=4096)
+def get_word_sprite(word, highlighted):
+    """
+    Rasteriza una palabra una sola vez (texto blanco, con o sin caja morada).
+    Devuelve el desplazamiento de la esquina respecto al origen del texto, el color
+    premultiplicado por el alfa y el alfa inverso, ambos en uint8 de 3 canales.
+    """
+    width, height = get_text_size(word, FONT, FONT_SCALE, THICKNESS)
+    baseline = cv2.getTextSize(word, FONT, FONT_SCALE, THICKNESS)[1]
+    left = 5 + THICKNESS
+    top = height + 10 + THICKNESS
+    bottom = max(10, baseline) + THICKNESS
+    canvas_size = (top + bottom + 1, left + width + 5 + THICKNESS + 1)
+
+    text_mask = np.zeros(canvas_size, dtype=np.uint8)
+    cv2.putText(text_mask, word, (left, top), FONT, FONT_SCALE, 255, THICKNESS, cv2.LINE_AA)
+    text_alpha = text_mask.astype(np.float32)[:, :, None] / 255
+
+    color = np.empty(canvas_size + (3,), dtype=np.float32)
+    color[...] = TEXT_COLOR
+    alpha = text_alpha
+    if highlighted:
+        box_alpha = np.zeros(canvas_size + (1,), dtype=np.float32)
+        box_alpha[top - height - 10:top + 10 + 1, left - 5:left + width + 5 + 1] = 1
+        color = np.array(HIGHLIGHT_COLOR, dtype=np.float32) * (1 - text_alpha) + color * text_alpha
+        alpha = np.maximum(box_alpha, text_alpha)
+
+    premultiplied = np.rint(color * alpha).astype(np.uint8)
+    inverse_alpha = np.repeat(np.rint((1 - alpha) * 255).astype(np.uint8), 3, axis=2)
+    return (-left, -top), premultiplied, inverse_alpha
+
+def blit_sprite(frame, sprite, x, y):
+    (offset_x, offset_y), premultiplied, inverse_alpha = sprite
+    frame_height, frame_width = frame.shape[:2]
+    x0, y0 = x + offset_x, y + offset_y
+    x1, y1 = x0 + premultiplied.shape[1], y0 + premultiplied.shape[0]
+
+    # Recortar el sprite a los bordes del frame
+    cx0, cy0 = max(x0, 0), max(y0, 0)
+    cx1, cy1 = min(x1, frame_width), min(y1, frame_height)
+    if cx1 <= cx0 or cy1 <= cy0:
+        return
+    patch = (slice(cy0 - y0, cy1 - y0), slice(cx0 - x0, cx1 - x0))
+
+    # Mezcla en el sitio sobre la región del frame: roi * (1 - alfa) + color * alfa
+    roi = frame[cy0:cy1, cx0:cx1]
+    cv2.multiply(roi, inverse_alpha[patch], dst=roi, scale=1 / 255)
+    cv2.add(roi, premultiplied[patch], dst=roi)
+
+def draw_cue(frame, placements, word_index):
+    # La caja resaltada va primero para que el texto de la otra línea quede encima
+    word, x, y = placements[word_index]
+    blit_sprite(frame, get_word_sprite(word, True), x, y)
+    for index, (word, x, y) in enumerate(placements):
+        if index != word_index:
+            blit_sprite(frame, get_word_sprite(word, False), x, y)
+
+def add_subtitles(get_frame, t, timeline, buffers):
+    """
+    Dibuja sobre el frame el subtítulo activo en t. `buffers` guarda un búfer por
+    tamaño de frame que se reutiliza en cada frame dibujado: el writer de moviepy
+    consume cada frame antes de pedir el siguiente, así que no hace falta uno nuevo.
+    """
+    frame = get_frame(t)
+    active = timeline.lookup(t)
+
+    # Sin subtítulo activo el frame pasa tal cual, sin conversiones ni copias
+    if active is None:
+        return frame
+
+    text, word_index = active
+    frame_height, frame_width = frame.shape[:2]
+    placements = get_cue_layout(text, frame_width, frame_height)
+    if not placements:
+        return frame
+
+    # Los frames del lector de moviepy son de solo lectura (y se reutilizan):
+    # se copian al búfer de este tamaño en lugar de reservar memoria en cada frame
+    if not frame.flags.writeable:
+        key = (frame.shape, frame.dtype.str)
+        buffer = buffers.get(key)
+        if buffer is None:
+            buffer = buffers[key] = np.empty_like(frame)
+        np.copyto(buffer, frame)
+        frame = buffer
+    draw_cue(frame, placements, min(word_index, len(placements) - 1))
+    return frame
@@ -0,0 +1,203 @@
+import os
+import re
+import json
+import uuid
+import queue
+import logging
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from s3_utils import upload_to_s3, BUCKET_NAME
+from transcription_utils import (start_transcription_job, wait_for_job_completion, download_transcription,
+                                 parse_word_timings, get_bucket_region, LANGUAGE_CODE)
+
+logger = logging.getLogger(__name__)
+
+LOCAL_FOLDER = '/tmp'
+# Transcribe solo acepta [0-9a-zA-Z._-] en el nombre del trabajo (hasta 200 caracteres)
+JOB_NAME_INVALID_CHARS = re.compile(r'[^0-9A-Za-z._-]')
+JOB_SUFFIX_MAX_LENGTH = 100
+
+class TranscriptionBackend(ABC):
+    """
+    Interfaz común de los motores de transcripción. transcribe_batch recibe una lista
+    de (ruta local, clave en S3 o None) y devuelve, para cada audio, la lista de
+    palabras [{'start', 'end', 'content'}] que usan words_to_srt y words_to_ass.
+    transcribe() encola un solo audio: las peticiones que llegan a la vez desde
+    varios hilos se agrupan en lotes de hasta batch_size y los lotes se procesan
+    en un pool de workers hilos.
+    """
+
+    name = None
+
+    def __init__(self, workers=1, batch_size=1, batch_wait=0.5):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.requests = queue.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.dispatcher = None
+        self.lock = threading.Lock()
+
+    @abstractmethod
+    def transcribe_batch(self, items):
+        """Devuelve la lista de palabras de cada (ruta local, clave en S3 o None) de items."""
+
+    def transcribe(self, audio_path, s3_key=None):
+        """Transcribe un audio y bloquea hasta tener sus palabras."""
+        future = Future()
+        with self.lock:
+            if self.dispatcher is None:
+                self.dispatcher = threading.Thread(target=self.dispatch, daemon=True)
+                self.dispatcher.start()
+        self.requests.put(((audio_path, s3_key), future))
+        return future.result()
+
+    def dispatch(self):
+        while True:
+            batch = [self.requests.get()]
+            # Esperar un poco a que lleguen más audios para el mismo lote
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.requests.get(timeout=self.batch_wait))
+                except queue.Empty:
+                    break
+            self.executor.submit(self.run_batch, batch)
+
+    def run_batch(self, batch):
+        try:
+            results = self.transcribe_batch([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+        else:
+            for (_, future), words in zip(batch, results):
+                future.set_result(words)
+
+class AWSTranscribeBackend(TranscriptionBackend):
+    """Amazon Transcribe: sube el audio (si no está ya en S3) y lanza un trabajo por archivo."""
+
+    name = 'aws'
+
+    def __init__(self, bucket_name=BUCKET_NAME, workers=8):
+        # Cada trabajo espera en el poller compartido, así que no se agrupan en lotes
+        super().__init__(workers=workers, batch_size=1)
+        self.bucket_name = bucket_name
+
+    def transcribe_batch(self, items):
+        return [self.transcribe_file(audio_path, s3_key) for audio_path, s3_key in items]
+
+    def transcribe_file(self, audio_path, s3_key=None):
+        if s3_key is None:
+            s3_key = os.path.basename(audio_path)
+            upload_to_s3(audio_path, s3_key)
+        job_suffix = os.path.splitext(os.path.basename(s3_key))[0]
+        return self.run_transcription_job(f"s3://{self.bucket_name}/{s3_key}", job_suffix)
+
+    def run_transcription_job(self, media_file_uri, job_suffix):
+        """Lanza un trabajo de Transcribe, espera a que termine y devuelve sus palabras con tiempos."""
+        # Generar un nombre único y válido para el trabajo (el sufijo viene del nombre del archivo)
+        job_suffix = JOB_NAME_INVALID_CHARS.sub('_', job_suffix)[:JOB_SUFFIX_MAX_LENGTH]
+        transcription_job_name = f"transcription_{uuid.uuid4().hex[:8]}_{job_suffix}"
+
+        try:
+            # Iniciar el trabajo de transcripción
+            logger.info(f"Iniciando trabajo de transcripción: {transcription_job_name}")
+            start_transcription_job(
+                bucket_name=self.bucket_name,
+                transcription_job_name=transcription_job_name,
+                media_file_uri=media_file_uri,
+                output_bucket_name=self.bucket_name,
+            )
+
+            # Esperar a que el trabajo de transcripción se complete
+            transcript_uri = wait_for_job_completion(transcription_job_name, get_bucket_region(self.bucket_name))
+            logger.info(f"Trabajo de transcripción completado: {transcription_job_name}")
+        except ClientError as e:
+            logger.error(f"Error starting transcription job: {e}")
+            raise
+
+        # Descargar la transcripción y verificar que no esté vacía
+        transcript_file = download_transcription(
+            transcript_uri, self.bucket_name, os.path.join(LOCAL_FOLDER, f"{transcription_job_name}.json"))
+        with open(transcript_file, 'r') as f:
+            transcript_data = json.load(f)
+        os.remove(transcript_file)
+
+        if not transcript_data.get('results', {}).get('transcripts', [{}])[0].get('transcript'):
+            logger.error(f"La transcripción está vacía para el trabajo {transcription_job_name}.")
+            raise ValueError(f"La transcripción está vacía para el trabajo {transcription_job_name}.")
+
+        return parse_word_timings(transcript_data)
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """
+    Transcripción local en CPU con faster-whisper, sin red ni colas externas.
+    Solo la transcripción es local: los assets, la caché y los listados siguen
+    leyéndose de S3.
+    Los audios de un lote se concatenan (separados por silencio) y se transcriben
+    en una sola llamada al modelo; luego las palabras se reparten y se re-basan
+    al inicio de cada audio.
+    """
+
+    name = 'local'
+    SAMPLE_RATE = 16000
+    GAP_SECONDS = 1.0  # Silencio entre audios del lote para que no se mezclen palabras
+
+    def __init__(self, model_size='small', workers=2, batch_size=4, cpu_threads=0, compute_type='int8'):
+        super().__init__(workers=workers, batch_size=batch_size)
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise ImportError("El backend 'local' necesita faster-whisper: pip install faster-whisper")
+        # num_workers permite que varios hilos usen el mismo modelo a la vez
+        self.model = WhisperModel(model_size, device='cpu', compute_type=compute_type,
+                                  cpu_threads=cpu_threads, num_workers=workers)
+        self.language = LANGUAGE_CODE.split('-')[0]
+
+    def transcribe_batch(self, items):
+        import numpy as np
+        from faster_whisper import decode_audio
+
+        gap = np.zeros(int(self.GAP_SECONDS * self.SAMPLE_RATE), dtype=np.float32)
+        pieces, offsets = [], []
+        position = 0.0
+        for audio_path, _ in items:
+            audio = decode_audio(audio_path, sampling_rate=self.SAMPLE_RATE)
+            offsets.append((position, position + len(audio) / self.SAMPLE_RATE))
+            pieces.extend([audio, gap])
+            position += (len(audio) + len(gap)) / self.SAMPLE_RATE
+
+        segments, _ = self.model.transcribe(np.concatenate(pieces), language=self.language, word_timestamps=True)
+        results = [[] for _ in items]
+        for segment in segments:
+            for word in segment.words or []:
+                for index, (start, end) in enumerate(offsets):
+                    if start <= word.start < end:
+                        results[index].append({
+                            'start': word.start - start,
+                            'end': min(word.end, end) - start,
+                            'content': word.word.strip()
+                        })
+                        break
+        return results
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_transcription_backend(name='aws'):
+    """Devuelve una instancia compartida del backend indicado ('aws' o 'local')."""
+    with _backends_lock:
+        if name not in _backends:
+            if name == 'aws':
+                _backends[name] = AWSTranscribeBackend()
+            elif name == 'local':
+                _backends[name] = LocalWhisperBackend(
+                    model_size=os.getenv('WHISPER_MODEL', 'small'),
+                    workers=int(os.getenv('WHISPER_WORKERS', 2)),
+                    batch_size=int(os.getenv('WHISPER_BATCH_SIZE', 4)),
+                )
+            else:
+                raise ValueError(f"Backend de transcripción desconocido: {name}")
+        return _backends[name]
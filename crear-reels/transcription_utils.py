@@ -1,9 +1,29 @@
+import os
 import boto3
-import time
 import json
 import datetime
 import uuid
+import threading
 import unicodedata
+from modules.transcription_poller import TranscriptionPoller
+
+LANGUAGE_CODE = 'es-US'  # Ajusta según sea necesario
+MEDIA_FORMATS = ('mp3', 'mp4', 'wav', 'flac', 'ogg', 'amr', 'webm', 'm4a')
+
+_clients = {}
+_pollers = {}
+_clients_lock = threading.Lock()
+
+def get_client(service_name, region_name=None):
+    """
+    Devuelve un cliente de boto3 reutilizable. Crear clientes desde la sesión por
+    defecto no es seguro entre hilos, así que se crean una vez bajo un candado.
+    """
+    with _clients_lock:
+        key = (service_name, region_name)
+        if key not in _clients:
+            _clients[key] = boto3.client(service_name, region_name=region_name)
+        return _clients[key]
 
 def replace_special_characters(text):
     """
@@ -31,7 +51,7 @@ def replace_special_characters(text):
 
 
 def get_bucket_region(bucket_name):
-    s3 = boto3.client('s3')
+    s3 = get_client('s3')
     response = s3.get_bucket_location(Bucket=bucket_name)
     region = response.get('LocationConstraint', 'us-east-1')  # Usar 'us-east-1' si la región no está disponible
     return region
@@ -41,59 +61,89 @@ def generate_unique_job_name(base_name):
     unique_id = uuid.uuid4().hex[:8]  # Genera un UUID corto
     return f"{base_name}_{timestamp}_{unique_id}"
 
+def get_media_format(path):
+    """Formato de Transcribe a partir de la extensión del archivo (mp3, wav, mp4...)."""
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    return extension if extension in MEDIA_FORMATS else 'mp4'
+
 def start_transcription_job(bucket_name,transcription_job_name, media_file_uri, output_bucket_name):
     region = get_bucket_region(bucket_name)
-    transcribe = boto3.client('transcribe', region_name=region)
+    transcribe = get_client('transcribe', region)
 
     
     transcribe.start_transcription_job(
         TranscriptionJobName=transcription_job_name,
         Media={'MediaFileUri': media_file_uri},
-        MediaFormat='mp4',
-        LanguageCode='es-US',  # Ajusta según sea necesario
+        MediaFormat=get_media_format(media_file_uri),
+        LanguageCode=LANGUAGE_CODE,
         OutputBucketName=output_bucket_name
     )
     return transcription_job_name
 
+def get_poller(region):
+    """Un solo poller por región sigue todos los trabajos de este proceso."""
+    transcribe = get_client('transcribe', region)
+    with _clients_lock:
+        if region not in _pollers:
+            _pollers[region] = TranscriptionPoller(transcribe)
+        return _pollers[region]
+
 def wait_for_job_completion(transcription_job_name, region):
-    transcribe = boto3.client('transcribe', region_name=region)
-    while True:
-        response = transcribe.get_transcription_job(TranscriptionJobName=transcription_job_name)
-        status = response['TranscriptionJob']['TranscriptionJobStatus']
-        if status in ['COMPLETED', 'FAILED']:
-            print(f"Job {status}")
-            if status == 'COMPLETED':
-                return response['TranscriptionJob']['Transcript']['TranscriptFileUri']
-            else:
-                raise Exception("Transcription job failed")
-        print("Waiting for job to complete...")
-        time.sleep(30)
+    transcript_uri = get_poller(region).wait(transcription_job_name)
+    print(f"Job COMPLETED: {transcription_job_name}")
+    return transcript_uri
 
 def download_transcription(transcript_uri, output_bucket_name, transcript_file_name='transcription.json'):
-    s3 = boto3.client('s3')
+    s3 = get_client('s3')
     s3.download_file(output_bucket_name, transcript_uri.split('/')[-1], transcript_file_name)
     return transcript_file_name
 
+def parse_word_timings(transcript_data):
+    """
+    Extrae de la respuesta de Transcribe la lista de palabras con sus tiempos:
+    [{'start': float, 'end': float, 'content': str}, ...]
+    """
+    words = []
+    for item in transcript_data['results']['items']:
+        if 'start_time' in item:
+            words.append({
+                'start': float(item['start_time']),
+                'end': float(item['end_time']),
+                'content': item['alternatives'][0]['content']
+            })
+    return words
+
+def slice_word_timings(words, start, end):
+    """
+    Devuelve las palabras que caen en [start, end) con los tiempos relativos a start,
+    como si se hubiera transcrito solo ese tramo del audio.
+    """
+    sliced = []
+    for word in words:
+        if word['start'] >= start and word['start'] < end:
+            sliced.append({
+                'start': word['start'] - start,
+                'end': min(word['end'], end) - start,
+                'content': word['content']
+            })
+    return sliced
+
 def json_to_srt(json_file, srt_file):
     with open(json_file, 'r') as f:
         data = json.load(f)
 
+    words_to_srt(parse_word_timings(data), srt_file)
+
+def words_to_srt(words, srt_file):
     with open(srt_file, 'w') as f:
-        index = 1
-        for item in data['results']['items']:
-            if 'start_time' in item:
-                start_time = float(item['start_time'])
-                end_time = float(item['end_time'])
-                text = item['alternatives'][0]['content']
-                
-                # Reemplazar caracteres especiales
-                text = replace_special_characters(text)
-                print(text)
-                
-                f.write(f"{index}\n")
-                f.write(f"{format_timestamp(start_time)} --> {format_timestamp(end_time)}\n")
-                f.write(f"{text}\n\n")
-                index += 1
+        for index, word in enumerate(words, start=1):
+            # Reemplazar caracteres especiales
+            text = replace_special_characters(word['content'])
+            print(text)
+
+            f.write(f"{index}\n")
+            f.write(f"{format_timestamp(word['start'])} --> {format_timestamp(word['end'])}\n")
+            f.write(f"{text}\n\n")
 
 def format_timestamp(seconds):
     td = datetime.timedelta(seconds=seconds)
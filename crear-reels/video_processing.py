@@ -1,13 +1,16 @@
 import os
 import random
-import uuid
 import logging
-import json
+import threading
 from moviepy.editor import VideoFileClip, AudioFileClip, CompositeAudioClip, concatenate_videoclips
-from s3_utils import upload_to_s3, download_from_s3
+from s3_utils import upload_to_s3, upload_output_to_s3, acquire_asset, get_etag
 from subtitle_utils import add_subtitles, open_srt
-from transcription_utils import start_transcription_job, wait_for_job_completion, download_transcription, json_to_srt, get_bucket_region
-from botocore.exceptions import ClientError
+from transcription_utils import words_to_srt, slice_word_timings, LANGUAGE_CODE
+from transcription_backends import get_transcription_backend
+from ass_utils import words_to_ass, ffmpeg_supports_subtitles, subtitles_filter
+from modules.transcript_cache import TranscriptCache
+from modules.subtitle_timeline import SubtitleTimeline
+from modules.ffmpeg_utils import STREAMABLE_MP4_PARAMS
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -19,13 +22,19 @@ HOOKS_FOLDER = 'hooks'
 VOICES_FOLDER = 'voices'
 FRAGMENT_DURATION = 83  # Duración de cada fragmento en segundos
 
+# Palabras ya transcritas por tramo de voz; evita repetir trabajos de Transcribe
+transcript_cache = TranscriptCache()
+# Ventana de la caché que representa el archivo de voz completo
+WHOLE_FILE_WINDOW = (0, 0)
+_voice_locks = {}
+_voice_locks_lock = threading.Lock()
+
 def normalize_audio(audio_clip):
     """Normaliza el volumen del clip de audio."""
     return audio_clip.volumex(1.0)  # Ajusta el volumen a 100%
 
 def get_voice_clip(voices, local_voice_path, voice_audio_s3_key, start_time, fragment_duration):
     """Obtiene un fragmento de voz que coincide con la duración del video."""
-    download_from_s3(voice_audio_s3_key, local_voice_path)
     voice_clip = AudioFileClip(local_voice_path)
     
     # Si el start_time excede la duración, reiniciar los tiempos
@@ -41,16 +50,65 @@ def get_voice_clip(voices, local_voice_path, voice_audio_s3_key, start_time, fra
 
     return voice_clip, start_time, end_time
 
-def process_single_reel(video_path, video_filename, start_time, fragment_index, music_path, hooks, voices, bucket_name):
-    video_clip = VideoFileClip(video_path)
-    end_time = min(start_time + FRAGMENT_DURATION, video_clip.duration)
-    video_fragment = video_clip.subclip(start_time, end_time)
+def process_single_reel(video_clip, video_filename, start_time, fragment_index, music_path, hooks, voices, bucket_name, subtitle_backend='opencv'):
+    """
+    Procesa un fragmento a partir del lector ya abierto de la fuente (video_clip).
+    El lector lo abre y lo cierra quien llama, una sola vez por video.
+    """
+    transcript = transcribe_fragment(video_filename, start_time, fragment_index, voices, bucket_name)
+    if transcript is None:
+        return None, None
+    fragment_path = render_fragment(video_clip, video_filename, start_time, fragment_index, music_path, hooks, transcript, subtitle_backend)
+    return upload_fragment(fragment_path)
 
-    # Seleccionar y descargar un archivo de voz desde la carpeta de voces
+def transcribe_fragment(video_filename, start_time, fragment_index, voices, bucket_name, transcription_mode='fragment', transcription_backend='aws'):
+    """
+    Etapa 1: elige y recorta la voz del fragmento y la transcribe.
+    No usa el lector de la fuente, así que puede ejecutarse en otro hilo.
+    Con transcription_mode='voice' se transcribe una sola vez el archivo de voz
+    completo y el fragmento usa el tramo de sus palabras que le corresponde.
+    transcription_backend elige el motor: 'aws' (Transcribe) o 'local' (faster-whisper).
+    """
+    backend = get_transcription_backend(transcription_backend)
+
+    # Seleccionar un archivo de voz de la carpeta de voces (descargado solo si no está en caché)
     voice_audio_s3_key = random.choice(voices)
-    local_voice_path = os.path.join(LOCAL_FOLDER, os.path.basename(voice_audio_s3_key))
-    
+    voice_etag = get_etag(voice_audio_s3_key)
+    voice_lease = acquire_asset(voice_audio_s3_key, voice_etag)
+    try:
+        return transcribe_voice_window(video_filename, start_time, fragment_index, voices, backend,
+                                       transcription_mode, voice_audio_s3_key, voice_etag, voice_lease)
+    except BaseException:
+        voice_lease.release()
+        raise
+
+def transcribe_voice_window(video_filename, start_time, fragment_index, voices, backend, transcription_mode,
+                            voice_audio_s3_key, voice_etag, voice_lease):
+    local_voice_path = voice_lease.path
     voice_clip, voice_start_time, voice_end_time = get_voice_clip(voices, local_voice_path, voice_audio_s3_key, start_time, FRAGMENT_DURATION)
+    transcript = {
+        'voice_path': local_voice_path,
+        # render_fragment libera la voz de la caché cuando termina de usarla
+        'voice_lease': voice_lease,
+        'voice_start_time': voice_start_time,
+        'voice_end_time': voice_end_time,
+    }
+
+    if transcription_mode == 'voice':
+        voice_clip.close()
+        voice_words = transcribe_voice_file(backend, voice_audio_s3_key, voice_etag, local_voice_path)
+        transcript['words'] = slice_word_timings(voice_words, voice_start_time, voice_end_time)
+        return transcript
+
+    # Si este tramo de esta voz ya se transcribió, no hace falta exportarlo ni subirlo
+    cache_key = TranscriptCache.cache_key(voice_etag, voice_start_time, voice_end_time,
+                                          LANGUAGE_CODE, backend.name)
+    words = transcript_cache.get(cache_key)
+    if words is not None:
+        logger.info(f"Transcripción en caché para {voice_audio_s3_key} [{voice_start_time}, {voice_end_time})")
+        voice_clip.close()
+        transcript['words'] = words
+        return transcript
 
     # Asegurarse de que el nombre del archivo de salida sea correcto
     audio_s3_key = f"voice_fragment_{fragment_index}_{video_filename}.wav"
@@ -58,61 +116,89 @@ def process_single_reel(video_path, video_filename, start_time, fragment_index,
 
     # Escribir el archivo de audio para transcripción
     try:
-        voice_clip.write_audiofile(complete_audio_path)
+        voice_clip.write_audiofile(complete_audio_path, logger=None)
     except OSError as e:
         logger.error(f"Error writing audio file: {e}")
-        return None, None
+        voice_lease.release()
+        return None
+    finally:
+        voice_clip.close()
 
-    # Subir el archivo de audio a S3
-    upload_to_s3(complete_audio_path, audio_s3_key)
-    media_file_uri = f"s3://{bucket_name}/{audio_s3_key}"
+    # El backend de AWS sube el audio a S3; el local lo transcribe en esta máquina
+    try:
+        transcript['words'] = backend.transcribe(complete_audio_path)
+    finally:
+        os.remove(complete_audio_path)
+    transcript_cache.put(cache_key, transcript['words'])
+    return transcript
 
-    # Generar un nombre único para el trabajo de transcripción
-    transcription_job_name = f"transcription_{uuid.uuid4().hex[:8]}_{fragment_index}"
+def transcribe_voice_file(backend, voice_audio_s3_key, voice_etag, local_voice_path):
+    """
+    Devuelve las palabras del archivo de voz completo, transcribiéndolo la primera
+    vez (el backend de AWS lo lee directamente de S3). Un candado por archivo evita
+    que dos fragmentos lancen a la vez la misma transcripción.
+    """
+    with get_voice_lock(voice_audio_s3_key):
+        cache_key = TranscriptCache.cache_key(voice_etag, *WHOLE_FILE_WINDOW,
+                                              LANGUAGE_CODE, backend.name)
+        words = transcript_cache.get(cache_key)
+        if words is None:
+            logger.info(f"Transcribiendo el archivo de voz completo: {voice_audio_s3_key}")
+            words = backend.transcribe(local_voice_path, s3_key=voice_audio_s3_key)
+            transcript_cache.put(cache_key, words)
+        return words
 
-    try:
-        # Iniciar el trabajo de transcripción
-        logger.info(f"Iniciando trabajo de transcripción: {transcription_job_name}")
-        start_transcription_job(
-            bucket_name=bucket_name,
-            transcription_job_name=transcription_job_name,
-            media_file_uri=media_file_uri,
-            output_bucket_name=bucket_name,
-        )
-        
-        # Esperar a que el trabajo de transcripción se complete
-        transcript_uri = wait_for_job_completion(transcription_job_name, get_bucket_region(bucket_name))
-        logger.info(f"Trabajo de transcripción completado: {transcription_job_name}")
-    except ClientError as e:
-        logger.error(f"Error starting transcription job: {e}")
-        raise
+def get_voice_lock(voice_audio_s3_key):
+    with _voice_locks_lock:
+        return _voice_locks.setdefault(voice_audio_s3_key, threading.Lock())
 
-    # Descargar la transcripción y verificar que no esté vacía
-    transcript_file = download_transcription(transcript_uri, bucket_name)
-    with open(transcript_file, 'r') as f:
-        transcript_data = json.load(f)
-    
-    if not transcript_data.get('results', {}).get('transcripts', [{}])[0].get('transcript'):
-        logger.error(f"La transcripción está vacía para el trabajo {transcription_job_name}.")
-        raise ValueError(f"La transcripción está vacía para el trabajo {transcription_job_name}.")
-    
-    # Generar el archivo SRT
-    srt_file = f"{os.path.splitext(video_filename)[0]}_{fragment_index}.srt"
-    json_to_srt(transcript_file, srt_file)
+def render_fragment(video_clip, video_filename, start_time, fragment_index, music_path, hooks, transcript,
+                    subtitle_backend='opencv', direct_upload=False, check_source=None):
+    """
+    Etapa 2: renderiza el reel (hook + fragmento con voz, música y subtítulos).
+    Devuelve la ruta local del reel; con direct_upload=True el reel (MP4 con faststart) se
+    escribe en la carpeta de salidas (tmpfs con ENCODE_IN_MEMORY, si hay sitio), se sube al
+    terminar y devuelve lo mismo que upload_fragment.
+    check_source(), si se indica, se llama tras codificar y antes de subir: debe lanzar
+    una excepción si la lectura de la fuente falló (p. ej. S3RangeServer.check).
+    """
+    end_time = min(start_time + FRAGMENT_DURATION, video_clip.duration)
+    video_fragment = video_clip.subclip(start_time, end_time)
+
+    voice_clip = AudioFileClip(transcript['voice_path'])
+    voice_clip = normalize_audio(voice_clip.subclip(transcript['voice_start_time'], transcript['voice_end_time']))
+    words = transcript['words']
+    subtitle_file = os.path.join(LOCAL_FOLDER, f"{os.path.splitext(video_filename)[0]}_{fragment_index}")
 
-    # Aplicar subtítulos al fragmento de video
-    subtitles = open_srt(srt_file)
-    video_fragment = video_fragment.fl(lambda gf, t: add_subtitles(gf, t, subtitles))
+    # El backend ASS quema los subtítulos con libass dentro del mismo encode de ffmpeg
+    use_ass = subtitle_backend == 'ass' and ffmpeg_supports_subtitles()
+    if subtitle_backend == 'ass' and not use_ass:
+        logger.warning("ffmpeg no tiene el filtro 'subtitles' (libass). Usando subtítulos con OpenCV.")
 
-    # Descargar y seleccionar un video "hook" aleatorio
+    if use_ass:
+        subtitle_file += '.ass'
+    else:
+        # Generar el archivo SRT
+        subtitle_file += '.srt'
+        words_to_srt(words, subtitle_file)
+
+        # Aplicar subtítulos al fragmento de video
+        subtitles = open_srt(subtitle_file)
+        timeline = SubtitleTimeline(subtitles, video_fragment.fps, video_fragment.duration)
+        # Un juego de búferes por fragmento: los fragmentos se renderizan en paralelo
+        subtitle_buffers = {}
+        video_fragment = video_fragment.fl(lambda gf, t: add_subtitles(gf, t, timeline, subtitle_buffers))
+
+    # Seleccionar un video "hook" aleatorio (descargado solo si no está en caché)
     hook_video_s3_key = random.choice(hooks)
-    local_hook_path = os.path.join(LOCAL_FOLDER, os.path.basename(hook_video_s3_key))
-    download_from_s3(hook_video_s3_key, local_hook_path)
-    hook_clip = VideoFileClip(local_hook_path)
+    hook_lease = acquire_asset(hook_video_s3_key)
+    hook_source = VideoFileClip(hook_lease.path)
+    music_source = AudioFileClip(music_path)
+    hook_clip = hook_source
 
     # Añadir música de fondo al "hook" sin reemplazar la voz
     hook_audio = hook_clip.audio
-    music_clip = AudioFileClip(music_path).subclip(0, hook_clip.duration).volumex(0.25)
+    music_clip = music_source.subclip(0, hook_clip.duration).volumex(0.25)
 
     # Crear una versión del hook con música de fondo
     combined_hook_audio = CompositeAudioClip([hook_audio, music_clip])
@@ -125,19 +211,62 @@ def process_single_reel(video_path, video_filename, start_time, fragment_index,
     # Combinar el hook y el fragmento
     final_clip = concatenate_videoclips([hook_clip, video_fragment])
 
-    # Guardar y subir el reel final
+    # Guardar el reel final
     fragment_filename = f"reel_{fragment_index}_{video_filename}"
     fragment_path = os.path.join(LOCAL_FOLDER, fragment_filename)
-    final_clip.write_videofile(fragment_path, codec='libx264', audio_codec='aac')
+    reel_s3_key = f"{OUTPUT_FOLDER}/{fragment_filename}"
+    ffmpeg_params = []
+    if use_ass:
+        # Los tiempos del ASS se desplazan por la duración del hook, que va primero
+        words_to_ass(words, subtitle_file, final_clip.size, offset=hook_clip.duration)
+        ffmpeg_params = ['-vf', subtitles_filter(os.path.abspath(subtitle_file))]
 
-    # Subir el reel a S3
+    def write_reel(path, **kwargs):
+        final_clip.write_videofile(path, codec='libx264', audio_codec='aac', **kwargs)
+        if check_source is not None:
+            check_source()  # Con la fuente cortada el reel sale congelado: no se sube
+
+    try:
+        if direct_upload:
+            upload_output_to_s3(reel_s3_key, lambda path: write_reel(
+                path, temp_audiofile=f"{path}.m4a", ffmpeg_params=ffmpeg_params + STREAMABLE_MP4_PARAMS))
+        else:
+            write_reel(fragment_path, ffmpeg_params=ffmpeg_params or None)
+    except BaseException:
+        # No dejar un reel a medio escribir en disco
+        discard_fragment(fragment_path)
+        raise
+    finally:
+        # Liberar los lectores de ffmpeg de este fragmento (el de la fuente sigue abierto)
+        hook_source.close()
+        music_source.close()
+        voice_clip.close()
+        # Hook y voz quedan en la caché para otros reels
+        hook_lease.release()
+        transcript['voice_lease'].release()
+        # Limpiar archivos locales
+        if os.path.exists(subtitle_file):
+            os.remove(subtitle_file)
+
+    if direct_upload:
+        return fragment_filename, reel_s3_key
+    return fragment_path
+
+def discard_transcript(transcript):
+    """Libera la voz de un fragmento transcrito que ya no se va a renderizar."""
+    if transcript is not None:
+        transcript['voice_lease'].release()
+
+def discard_fragment(fragment_path):
+    """Borra un reel renderizado que no se va a subir (con direct_upload ya está en S3)."""
+    if isinstance(fragment_path, str) and os.path.exists(fragment_path):
+        os.remove(fragment_path)
+
+def upload_fragment(fragment_path):
+    """Etapa 3: sube el reel a S3 y elimina el archivo local."""
+    fragment_filename = os.path.basename(fragment_path)
     reel_s3_key = f"{OUTPUT_FOLDER}/{fragment_filename}"
     upload_to_s3(fragment_path, reel_s3_key)
-    
-    # Limpiar archivos locales
     os.remove(fragment_path)
-    os.remove(local_hook_path)
-    os.remove(srt_file)
-    os.remove(local_voice_path)
 
     return fragment_filename, reel_s3_key
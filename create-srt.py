@@ -1,7 +1,7 @@
 import boto3
-import time
 import json
 import datetime
+from modules.transcription_poller import TranscriptionPoller
 
 # AWS Transcribe and S3 clients
 transcribe = boto3.client('transcribe')
@@ -23,17 +23,14 @@ def start_transcription_job():
     )
 
 def wait_for_job_completion():
-    while True:
-        response = transcribe.get_transcription_job(TranscriptionJobName=transcription_job_name)
-        status = response['TranscriptionJob']['TranscriptionJobStatus']
-        if status in ['COMPLETED', 'FAILED']:
-            print(f"Job {status}")
-            if status == 'COMPLETED':
-                return response['TranscriptionJob']['Transcript']['TranscriptFileUri']
-            else:
-                raise Exception("Transcription job failed")
-        print("Waiting for job to complete...")
-        time.sleep(30)
+    # Un solo trabajo: el poller se cierra al terminar para no dejar su hilo y su executor vivos
+    poller = TranscriptionPoller(transcribe)
+    try:
+        transcript_uri = poller.wait(transcription_job_name)
+    finally:
+        poller.close()
+    print("Job COMPLETED")
+    return transcript_uri
 
 def download_transcription(transcript_uri):
     transcript_file_name = 'transcription.json'
@@ -1,14 +1,14 @@
 import os
-import boto3
+from modules.s3_transfer import s3
+from modules.s3_listing import S3Listing
 
-s3 = boto3.client('s3')
 BUCKET_NAME = 'facebook-videos-bucket'
 REEL_FOLDER = 'reels'
 FRAGMENT_LOG_FILE = 'processed_fragments.log'
 
 def initialize_log_from_reels():
-    # Obtener todos los archivos en la carpeta 'reels'
-    s3_objects = s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=REEL_FOLDER).get('Contents', [])
+    # Obtener todos los archivos en la carpeta 'reels' (listado completo: el log se reconstruye desde cero)
+    s3_objects = S3Listing(BUCKET_NAME, s3).list_objects(REEL_FOLDER, refresh='full')
     processed_fragments = {}
 
     for obj in s3_objects:
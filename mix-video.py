@@ -1,10 +1,12 @@
 import os
 import random
-import boto3
 from moviepy.editor import VideoFileClip, concatenate_videoclips
 
-# Initialize S3 client
-s3 = boto3.client('s3')
+# Shared S3 client and tuned transfers
+from config import Config
+from modules.ffmpeg_utils import STREAMABLE_MP4_PARAMS
+from modules.s3_transfer import s3, download_file, upload_file, upload_output
+from modules.s3_listing import S3Listing
 
 # S3 Bucket and Folder details
 BUCKET_NAME = 'facebook-videos-bucket'
@@ -14,14 +16,12 @@ OUTPUT_FOLDER = 'video-to-mix'
 LOG_FILE = 'processed_videos.log'  # Log file to track processed videos
 
 def download_from_s3(s3_key, local_path):
-    s3.download_file(BUCKET_NAME, s3_key, local_path)
-    print(f"Downloaded {s3_key} to {local_path}")
+    download_file(BUCKET_NAME, s3_key, local_path)
 
 def upload_to_s3(local_path, s3_key):
-    s3.upload_file(local_path, BUCKET_NAME, s3_key)
-    print(f"Uploaded {local_path} to {s3_key}")
+    upload_file(local_path, BUCKET_NAME, s3_key)
 
-def create_random_subclips_and_combine(video_path, output_folder, min_duration=30, max_duration=100):
+def create_random_subclips_and_combine(video_path, output_path, min_duration=30, max_duration=100, streamable=False):
     # Load the video
     video = VideoFileClip(video_path)
     
@@ -44,14 +44,13 @@ def create_random_subclips_and_combine(video_path, output_folder, min_duration=3
     # Combine all the subclips into a single video
     final_video = concatenate_videoclips(subclips)
     
-    # Create a filename for the final combined video
-    final_video_filename = f"combined_video_{os.path.basename(video_path)}"
-    final_video_path = os.path.join(output_folder, final_video_filename)
+    # Write the final video; a streamable one (faststart) can be probed and read by ranges from S3
+    extra_args = {}
+    if streamable:
+        extra_args = {'temp_audiofile': f"{output_path}.m4a", 'ffmpeg_params': STREAMABLE_MP4_PARAMS}
+    final_video.write_videofile(output_path, codec="libx264", audio_codec="aac", **extra_args)
     
-    # Write the final video to a file
-    final_video.write_videofile(final_video_path, codec="libx264", audio_codec="aac")
-    
-    return final_video_path
+    return output_path
 
 def load_processed_videos():
     if not os.path.exists(LOG_FILE):
@@ -71,18 +70,24 @@ def process_video_from_s3(video_s3_key):
     # Download the video from S3
     download_from_s3(video_s3_key, local_video_path)
     
-    # Create subclips and combine them into a final video
-    final_video_path = create_random_subclips_and_combine(local_video_path, LOCAL_FOLDER)
-    
-    # Upload the final combined video back to S3
-    upload_to_s3(final_video_path, f"{OUTPUT_FOLDER}/{os.path.basename(final_video_path)}")
+    # Create subclips and combine them into a final video, then upload it back to S3
+    final_video_filename = f"combined_video_{video_filename}"
+    final_video_key = f"{OUTPUT_FOLDER}/{final_video_filename}"
+    if Config.ENCODE_IN_MEMORY:
+        # The encoder writes to tmpfs if the output fits (about the source's size), then it is uploaded
+        upload_output(BUCKET_NAME, final_video_key, lambda path: create_random_subclips_and_combine(
+            local_video_path, path, streamable=True), expected_size=os.path.getsize(local_video_path))
+    else:
+        final_video_path = create_random_subclips_and_combine(
+            local_video_path, os.path.join(LOCAL_FOLDER, final_video_filename))
+        upload_to_s3(final_video_path, final_video_key)
+        os.remove(final_video_path)
     
     # Log the processed video
     log_processed_video(video_filename)
     
     # Cleanup local files
     os.remove(local_video_path)
-    os.remove(final_video_path)
     print("Processing complete and files cleaned up.")
 
 def process_all_videos():
@@ -90,8 +95,7 @@ def process_all_videos():
     processed_videos = load_processed_videos()
     
     # List all videos in the S3 folder
-    s3_video_objects = s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=VIDEO_FOLDER).get('Contents', [])
-    video_files = [obj['Key'] for obj in s3_video_objects if obj['Key'].endswith('.mp4')]
+    video_files = S3Listing(BUCKET_NAME, s3).keys(VIDEO_FOLDER, suffixes=('.mp4',))
     
     for video_s3_key in video_files:
         video_filename = os.path.basename(video_s3_key)
@@ -0,0 +1,144 @@
+import os
+import fcntl
+import hashlib
+from config import Config
+from modules.s3_transfer import s3, download_file
+
+class AssetLease:
+    """Uso de un archivo de la caché: mientras no se libere, la evicción no lo borra."""
+
+    def __init__(self, path, lock_fd):
+        self.path = path
+        self.lock_fd = lock_fd
+
+    def release(self):
+        if self.lock_fd is not None:
+            os.close(self.lock_fd)  # Cerrar el descriptor libera el flock
+            self.lock_fd = None
+
+    def __enter__(self):
+        return self.path
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+class AssetCache:
+    """
+    Caché local de archivos de S3 (hooks, voces, música) indexada por clave + ETag,
+    así que una versión nueva del objeto nunca reutiliza la anterior.
+    Cada entrada tiene un archivo .lock con flock: lock exclusivo mientras se descarga
+    y compartido mientras alguien la usa, de modo que varios hilos o procesos pueden
+    compartir la caché y la evicción (LRU por fecha de uso) salta lo que está en uso.
+    """
+
+    def __init__(self, bucket_name=None, cache_dir=None, max_bytes=None):
+        self.bucket_name = bucket_name or Config.S3_BUCKET_NAME
+        self.cache_dir = cache_dir or Config.ASSET_CACHE_FOLDER
+        self.max_bytes = max_bytes if max_bytes is not None else Config.ASSET_CACHE_MAX_BYTES
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def entry_path(self, s3_key, etag):
+        digest = hashlib.sha256(f"{s3_key}\n{etag.strip(chr(34))}".encode('utf-8')).hexdigest()[:32]
+        # Se conserva la extensión: moviepy/ffmpeg la usan para detectar el formato
+        return os.path.join(self.cache_dir, f"{digest}{os.path.splitext(s3_key)[1]}")
+
+    def acquire(self, s3_key, etag=None):
+        """
+        Devuelve un AssetLease con la ruta local del objeto, descargándolo solo si no
+        está en caché. Hay que llamar a release() (o usarlo con with) al terminar.
+        """
+        if etag is None:
+            etag = s3.head_object(Bucket=self.bucket_name, Key=s3_key)['ETag']
+        path = self.entry_path(s3_key, etag)
+        while True:
+            lock_fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_SH)
+                if not os.path.exists(path):
+                    # Pasar a exclusivo para descargar (soltando antes el compartido para que dos
+                    # hilos no se bloqueen entre sí); otro pudo bajarlo mientras tanto
+                    fcntl.flock(lock_fd, fcntl.LOCK_UN)
+                    fcntl.flock(lock_fd, fcntl.LOCK_EX)
+                    if not self.is_current_lock(lock_fd, path):
+                        os.close(lock_fd)
+                        continue
+                    if not os.path.exists(path):
+                        download_path = f"{path}.download"
+                        download_file(self.bucket_name, s3_key, download_path)
+                        os.replace(download_path, path)
+                        self.evict(keep=path)
+                    fcntl.flock(lock_fd, fcntl.LOCK_SH)
+                else:
+                    print(f"Usando {s3_key} desde la caché local")
+                if not self.is_current_lock(lock_fd, path) or not os.path.exists(path):
+                    # La evicción borró la entrada y su .lock mientras se esperaba el candado
+                    os.close(lock_fd)
+                    continue
+                os.utime(path)  # Marcar como usado recientemente
+            except BaseException:
+                os.close(lock_fd)
+                raise
+            return AssetLease(path, lock_fd)
+
+    @staticmethod
+    def is_current_lock(lock_fd, path):
+        """Si lock_fd sigue siendo el .lock de path (la evicción puede haberlo borrado)."""
+        try:
+            return os.fstat(lock_fd).st_ino == os.stat(f"{path}.lock").st_ino
+        except FileNotFoundError:
+            return False
+
+    def evict(self, keep=None):
+        entries = []
+        orphan_locks = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith('.lock'):
+                if not os.path.exists(path[:-len('.lock')]):
+                    orphan_locks.append(path[:-len('.lock')])
+                continue
+            if name.count('.') > 1:
+                # Las entradas son <digest><extensión>; lo demás son temporales
+                # (.download, .part, .part.json, .tmp, los de boto3...) de descargas en curso
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue  # Otro proceso la borró mientras se listaba
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            if self.remove_entry(path):
+                total -= size
+
+        # .lock de descargas que fallaron o de entradas que otro proceso ya borró
+        for path in orphan_locks:
+            if path != keep:
+                self.remove_entry(path)
+
+    def remove_entry(self, path):
+        """Borra la entrada y su .lock si nadie la está usando; devuelve si se borró la entrada."""
+        lock_fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            # Si alguien la está usando (o descargando), se salta esta entrada
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(lock_fd)
+            return False
+        try:
+            removed = False
+            if os.path.exists(path):
+                os.remove(path)
+                removed = True
+            # Con el candado exclusivo tomado: quien esté esperando este .lock lo
+            # detecta con is_current_lock y vuelve a abrirlo
+            if self.is_current_lock(lock_fd, path):
+                os.remove(f"{path}.lock")
+            return removed
+        finally:
+            os.close(lock_fd)
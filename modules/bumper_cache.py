@@ -0,0 +1,64 @@
+import os
+import json
+import hashlib
+import threading
+from config import Config
+from modules.ffmpeg_utils import normalize_video
+
+class BumperCache:
+    """
+    Guarda en disco las versiones normalizadas de los clips de inicio/final.
+    La clave es un hash del contenido del clip y de los parámetros de codificación;
+    cuando el tamaño total supera el límite se eliminan las entradas menos usadas.
+    """
+
+    def __init__(self, encode_args, cache_dir=None, max_bytes=None):
+        self.encode_args = list(encode_args)
+        self.cache_dir = cache_dir or Config.BUMPER_CACHE_FOLDER
+        self.max_bytes = max_bytes if max_bytes is not None else Config.BUMPER_CACHE_MAX_BYTES
+        self.lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def cache_key(self, source_path):
+        digest = hashlib.sha256()
+        digest.update(json.dumps(self.encode_args).encode('utf-8'))
+        with open(source_path, 'rb') as source:
+            for chunk in iter(lambda: source.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get(self, source_path):
+        """Devuelve la ruta del clip normalizado, codificándolo solo si no está en caché."""
+        cached_path = os.path.join(self.cache_dir, f"{self.cache_key(source_path)}.mp4")
+        with self.lock:
+            if os.path.exists(cached_path):
+                os.utime(cached_path)  # Marcar como usado recientemente
+                return cached_path
+
+            tmp_path = f"{cached_path}.{os.getpid()}.tmp.mp4"
+            try:
+                normalize_video(source_path, tmp_path, self.encode_args)
+                os.replace(tmp_path, cached_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+            self.evict(keep=cached_path)
+            return cached_path
+
+    def evict(self, keep=None):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith('.mp4') and not name.endswith('.tmp.mp4'):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            os.remove(path)
+            total -= size
@@ -1,18 +1,36 @@
 import os
+import json
+import time
+import itertools
+import threading
 import requests
 import boto3
+from config import Config
+from modules.s3_listing import S3Listing
+from modules.publishing_engine import PublishingEngine
 
 class FacebookReelsUploader:
-    def __init__(self, page_id, access_token, log_file='uploaded_reels.log', bucket_name='facebook-videos-bucket', s3_folder='reel'):
+    def __init__(self, page_id, access_token, log_file='uploaded_reels.log', bucket_name='facebook-videos-bucket', s3_folder='reel',
+                 graph_url=None, chunk_size=None, max_retries=None, state_dir=None):
         self.page_id = page_id
         self.access_token = access_token
         self.log_file = log_file
+        self.log_lock = threading.Lock()  # Varios workers registran subidas a la vez
         self.bucket_name = bucket_name
         self.s3_folder = s3_folder
         self.s3_client = boto3.client('s3')
+        self.s3_listing = S3Listing(bucket_name, self.s3_client)
+        # Endpoint de la Graph API (se puede apuntar a un servidor local, ver tests/fake_graph.py)
+        self.graph_url = (graph_url or Config.FB_GRAPH_URL).rstrip('/')
+        self.chunk_size = chunk_size or Config.FB_UPLOAD_CHUNK_SIZE
+        self.max_retries = max_retries if max_retries is not None else Config.FB_UPLOAD_MAX_RETRIES
+        self.retry_wait = Config.FB_UPLOAD_RETRY_WAIT
+        # Estado de las subidas a medias, para reanudarlas tras un corte o un reinicio
+        self.state_dir = state_dir or Config.FB_UPLOAD_STATE_FOLDER
+        os.makedirs(self.state_dir, exist_ok=True)
 
     def start_upload(self):
-        upload_start_url = f"https://graph.facebook.com/v20.0/{self.page_id}/video_reels"
+        upload_start_url = f"{self.graph_url}/{self.page_id}/video_reels"
         data = {
             'upload_phase': 'start',
             'access_token': self.access_token
@@ -28,40 +46,182 @@ class FacebookReelsUploader:
             print(f"Error initiating upload for FB Reels: {upload_start_url}, {e}")
             return None, None
 
-    def upload_binary(self, upload_url, video_path, file_size):
+    def upload_binary(self, upload_url, video_path, file_size, offset=0, video_id=None, on_progress=None):
+        """
+        Sube el archivo desde offset en trozos de chunk_size con las cabeceras offset/file_size.
+        Si un trozo falla se pregunta al servidor cuántos bytes tiene (con video_id) y se
+        reenvía solo lo que falta. on_progress(offset) se llama tras cada trozo confirmado.
+        """
         headers = {
             'Authorization': f'OAuth {self.access_token}',
-            'offset': '0',
             'file_size': str(file_size)
         }
+        result = {'success': True}  # Si ya estaba todo subido no hay nada que enviar
+        retries = 0
 
         with open(video_path, 'rb') as video_file:
+            while offset < file_size:
+                video_file.seek(offset)
+                chunk = video_file.read(self.chunk_size)
+                try:
+                    response = requests.post(upload_url, headers=dict(headers, offset=str(offset)), data=chunk)
+                    response.raise_for_status()
+                    result = response.json()
+                except requests.exceptions.RequestException as e:
+                    retries += 1
+                    if retries > self.max_retries:
+                        print(f"Error uploading binary for Facebook Reels: {upload_url}, {e}")
+                        return None
+                    wait = min(self.retry_wait * 2 ** (retries - 1), 60)
+                    print(f"Error subiendo {os.path.basename(video_path)} en el byte {offset}: {e}. "
+                          f"Reintento {retries}/{self.max_retries} en {wait}s")
+                    time.sleep(wait)
+                    if video_id:
+                        try:
+                            confirmed = self.get_upload_offset(video_id)
+                        except requests.exceptions.RequestException as e:
+                            print(f"Error consultando el estado de la subida {video_id}: {e}")
+                            confirmed = None
+                        if confirmed is not None:
+                            offset = confirmed
+                    continue
+
+                retries = 0
+                offset += len(chunk)
+                if on_progress:
+                    on_progress(offset)
+
+        return result
+
+    def get_upload_offset(self, video_id):
+        """
+        Bytes que el servidor tiene confirmados de la subida, o None si la sesión ya no
+        existe (respuesta 4xx o sin estado de subida). Los errores de red y los 5xx se
+        propagan como RequestException: no dicen nada de la sesión.
+        """
+        response = requests.get(f"{self.graph_url}/{video_id}",
+                                params={'fields': 'status', 'access_token': self.access_token})
+        if 400 <= response.status_code < 500:
+            print(f"La subida {video_id} ya no existe en el servidor: {response.status_code} {response.text}")
+            return None
+        response.raise_for_status()
+        try:
+            return int(response.json()['status']['uploading_phase']['bytes_transferred'])
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Respuesta sin estado de subida para {video_id}: {e}")
+            return None
+
+    def resume_offset(self, video_id):
+        """get_upload_offset con reintentos; si la red sigue fallando se propaga el error."""
+        for attempt in range(1, self.max_retries + 2):
             try:
-                response = requests.post(upload_url, headers=headers, data=video_file)
-                response.raise_for_status()
-                return response.json()
+                return self.get_upload_offset(video_id)
             except requests.exceptions.RequestException as e:
-                print(f"Error uploading binary for Facebook Reels: {upload_url}, {e}")
-                return None
+                if attempt > self.max_retries:
+                    raise
+                wait = min(self.retry_wait * 2 ** (attempt - 1), 60)
+                print(f"Error consultando el estado de la subida {video_id}: {e}. "
+                      f"Reintento {attempt}/{self.max_retries} en {wait}s")
+                time.sleep(wait)
 
     def finalize_upload(self, video_id, title, description):
-        base_publish_reels_uri = (
-            f"https://graph.facebook.com/{self.page_id}/video_reels?"
-            f"upload_phase=finish&video_id={video_id}&title={title}"
-            f"&description={description}&video_state=PUBLISHED&access_token={self.access_token}"
-        )
+        finish_url = f"{self.graph_url}/{self.page_id}/video_reels"
+        params = {
+            'upload_phase': 'finish',
+            'video_id': video_id,
+            'title': title,
+            'description': description,
+            'video_state': 'PUBLISHED',
+            'access_token': self.access_token
+        }
         try:
-            response = requests.post(base_publish_reels_uri)
+            response = requests.post(finish_url, params=params)
             response.raise_for_status()
             print(response.json())
             return response.json().get('success')
         except requests.exceptions.RequestException as e:
-            print(f"Error publishing for Facebook Reels: {base_publish_reels_uri}, {e}")
+            print(f"Error publishing for Facebook Reels: {finish_url}, {e}")
+            return None
+
+    def upload_state_path(self, video_filename):
+        return os.path.join(self.state_dir, f"{video_filename}.json")
+
+    def load_upload_state(self, video_filename, file_size):
+        path = self.upload_state_path(video_filename)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                state = json.load(f)
+        except (IOError, ValueError) as e:
+            print(f"Error al leer el estado de subida de {video_filename}: {e}")
             return None
+        # Un archivo distinto con el mismo nombre empieza de cero
+        return state if state.get('file_size') == file_size else None
+
+    def save_upload_state(self, video_filename, state):
+        path = self.upload_state_path(video_filename)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def clear_upload_state(self, video_filename):
+        path = self.upload_state_path(video_filename)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def upload_reel(self, video_path, video_filename, title, description):
+        """
+        Sube y publica un reel. Si quedó una subida a medias de este archivo (por un corte
+        o un reinicio), la continúa desde el último byte confirmado por el servidor.
+        """
+        file_size = os.path.getsize(video_path)
+        state = self.load_upload_state(video_filename, file_size)
+        if state is not None:
+            try:
+                confirmed = self.resume_offset(state['video_id'])
+            except requests.exceptions.RequestException as e:
+                # Sin respuesta del servidor no se sabe si la sesión sigue viva: se conserva
+                # el estado y la próxima ejecución lo vuelve a intentar
+                print(f"No se pudo consultar la subida a medias de {video_filename}: {e}")
+                return False
+            if confirmed is None:
+                # La sesión ya no existe en el servidor (caducó o falló): empezar otra
+                self.clear_upload_state(video_filename)
+                state = None
+            else:
+                state['offset'] = confirmed
+                print(f"Reanudando la subida de {video_filename} desde el byte {confirmed} de {file_size}.")
+
+        if state is None:
+            video_id, upload_url = self.start_upload()
+            if not (video_id and upload_url):
+                print(f"No se pudo iniciar la subida para {video_filename}.")
+                return False
+            state = {'video_id': video_id, 'upload_url': upload_url, 'file_size': file_size, 'offset': 0}
+            self.save_upload_state(video_filename, state)
+
+        def save_progress(offset):
+            state['offset'] = offset
+            self.save_upload_state(video_filename, state)
+
+        if not self.upload_binary(state['upload_url'], video_path, file_size, state['offset'],
+                                  state['video_id'], on_progress=save_progress):
+            print(f"Error al subir el video {video_filename}.")
+            return False
+        if not self.finalize_upload(state['video_id'], title, description):
+            print(f"Error al finalizar la publicación del Reel {video_filename}.")
+            return False
+
+        print(f"Reel {video_filename} subido y publicado con éxito.")
+        self.log_uploaded_video(video_filename)
+        self.clear_upload_state(video_filename)
+        return True
 
     def log_uploaded_video(self, video_filename):
         try:
-            with open(self.log_file, 'a') as log:
+            with self.log_lock, open(self.log_file, 'a') as log:
                 log.write(video_filename + '\n')
         except IOError as e:
             print(f"Error al escribir en el archivo de log: {e}")
@@ -76,9 +236,9 @@ class FacebookReelsUploader:
             print(f"Error al leer el archivo de log: {e}")
             return set()
 
-    def download_videos_from_s3(self, local_folder='/tmp'):
-        s3_objects = self.s3_client.list_objects_v2(Bucket=self.bucket_name, Prefix=self.s3_folder).get('Contents', [])
-        video_files = [obj['Key'] for obj in s3_objects if obj['Key'].endswith('.mp4')]
+    def pending_videos(self):
+        """Claves de S3 de los reels que aún no se han subido, sin descargar nada."""
+        video_files = self.s3_listing.keys(self.s3_folder, suffixes=('.mp4',))
         uploaded_videos = self.get_uploaded_videos()
 
         for s3_key in video_files:
@@ -86,40 +246,62 @@ class FacebookReelsUploader:
             if video_filename in uploaded_videos:
                 print(f"El video {video_filename} ya ha sido subido anteriormente. Saltando...")
                 continue
+            yield s3_key, video_filename
 
-            local_path = os.path.join(local_folder, video_filename)
-            self.s3_client.download_file(self.bucket_name, s3_key, local_path)
-            yield local_path, video_filename
+    def download_video(self, s3_key, local_folder='/tmp'):
+        local_path = os.path.join(local_folder, os.path.basename(s3_key))
+        self.s3_client.download_file(self.bucket_name, s3_key, local_path)
+        return local_path
 
-    def upload_videos(self, title, description, local_folder='/tmp', batch_size=5, max_videos=30):
-        video_generator = self.download_videos_from_s3(local_folder)
-        video_files = list(video_generator)[:max_videos]  # Limitar a un máximo de 30 videos
-        total_videos = len(video_files)
+    def download_videos_from_s3(self, local_folder='/tmp'):
+        for s3_key, video_filename in self.pending_videos():
+            yield self.download_video(s3_key, local_folder), video_filename
 
-        for i in range(0, total_videos, batch_size):
-            batch_videos = video_files[i:i + batch_size]
+    def upload_videos(self, title, description, local_folder='/tmp', batch_size=5, max_videos=30, prefetch=2):
+        """
+        Descarga y sube hasta max_videos reels en un pipeline: las descargas van por delante
+        de las subidas como mucho prefetch archivos, así que en disco nunca hay más de
+        batch_size + prefetch reels y la primera subida empieza al terminar la primera descarga.
+        Cada reel se descarga solo después de tener su token de publicación: con el cupo
+        agotado se espera sin ningún archivo en disco.
+        """
+        slots = threading.BoundedSemaphore(batch_size + prefetch)
 
-            for video_path, video_filename in batch_videos:
-                if not os.path.exists(video_path):
-                    print(f"Error: el archivo {video_filename} no existe en la ruta {video_path}. Saltando...")
+        # batch_size reels se suben a la vez; el cupo de Reels de la página lo controla el motor
+        with PublishingEngine('reels', capacity=Config.FB_REELS_PER_PERIOD, refill_period=Config.FB_REELS_PERIOD,
+                              workers=batch_size) as engine:
+            futures = []
+            for s3_key, video_filename in itertools.islice(self.pending_videos(), max_videos):
+                engine.acquire(self.page_id)  # Esperar cupo antes de ocupar disco
+                slots.acquire()  # Esperar a que una subida termine y deje sitio en disco
+                try:
+                    video_path = self.download_video(s3_key, local_folder)
+                except Exception as e:
+                    slots.release()
+                    engine.refund(self.page_id)  # Este reel no se publica: no gastar su cupo
+                    if S3Listing.is_missing(e):
+                        # Borrado desde el último listado completo
+                        self.s3_listing.forget(self.s3_folder, s3_key)
+                    print(f"Error al descargar {s3_key}: {e}. Saltando...")
                     continue
-                
-                video_id, upload_url = self.start_upload()
-                if video_id and upload_url:
-                    file_size = os.path.getsize(video_path)
-                    if self.upload_binary(upload_url, video_path, file_size):
-                        if self.finalize_upload(video_id, title, description):
-                            print(f"Reel {video_filename} subido y publicado con éxito.")
-                            self.log_uploaded_video(video_filename)
-                            
-                            # Opción para eliminar el archivo local después de la subida
-                            try:
-                                os.remove(video_path)
-                            except OSError as e:
-                                print(f"Error al eliminar el archivo {video_filename}: {e}")
-                        else:
-                            print(f"Error al finalizar la publicación del Reel {video_filename}.")
-                    else:
-                        print(f"Error al subir el video {video_filename}.")
-                else:
-                    print(f"No se pudo iniciar la subida para {video_filename}.")
+
+                future = engine.submit_acquired(self.upload_and_remove, video_path, video_filename, title, description)
+                future.add_done_callback(lambda _: slots.release())
+                futures.append((video_filename, future))
+
+            for video_filename, future in futures:
+                try:
+                    future.result()
+                except (IOError, requests.exceptions.RequestException) as e:
+                    print(f"Error al subir el video {video_filename}: {e}")
+
+    def upload_and_remove(self, video_path, video_filename, title, description):
+        try:
+            return self.upload_reel(video_path, video_filename, title, description)
+        finally:
+            # También si falla: la próxima ejecución lo vuelve a descargar y reanuda la
+            # subida desde el estado guardado, y así el disco no se llena de reintentos
+            try:
+                os.remove(video_path)
+            except OSError as e:
+                print(f"Error al eliminar el archivo {video_filename}: {e}")
@@ -1,7 +1,8 @@
 import os
 import requests
-import time
 import threading
+from concurrent.futures import as_completed
+from modules.publishing_engine import PublishingEngine
 
 class FacebookUploader:
     def __init__(self, access_token, page_id, log_file='uploaded_videos.log'):
@@ -9,6 +10,7 @@ class FacebookUploader:
         self.page_id = page_id
         self.api_url = f"https://graph.facebook.com/v16.0/{self.page_id}/videos"
         self.log_file = log_file
+        self.log_lock = threading.Lock()  # Varios workers registran subidas a la vez
 
     def upload_video(self, video_filename, title, description, segments_folder='static/uploads/segments'):
         video_path = os.path.join(segments_folder, video_filename)
@@ -37,37 +39,41 @@ class FacebookUploader:
         else:
             return {"success": False, "status_code": response.status_code, "response": response.json()}
 
-    def upload_videos_in_batches(self, title, description, segments_folder='static/uploads/segments', batch_size=5, wait_time=5*60*60):
+    def upload_videos_in_batches(self, title, description, segments_folder='static/uploads/segments', batch_size=5, wait_time=5*60*60, workers=None):
         video_files = [f for f in os.listdir(segments_folder) if f.endswith('.mp4')]
         uploaded_videos = self.get_uploaded_videos()
 
         # Filtrar videos que ya han sido subidos
         video_files = [f for f in video_files if f not in uploaded_videos]
 
-        total_videos = len(video_files)
-        
-        for i in range(0, total_videos, batch_size):
-            batch_videos = video_files[i:i+batch_size]
-            for video_filename in batch_videos:
-                result = self.upload_video(video_filename, title, description, segments_folder)
+        # batch_size videos cada wait_time segundos es el cupo de la página: se sube en
+        # paralelo mientras haya tokens y el cupo gastado sobrevive a un reinicio
+        with PublishingEngine('videos', capacity=batch_size, refill_period=wait_time, workers=workers) as engine:
+            futures = {
+                engine.submit(self.page_id, self.upload_video, video_filename, title, description, segments_folder): video_filename
+                for video_filename in video_files
+            }
+            for future in as_completed(futures):
+                video_filename = futures[future]
+                try:
+                    result = future.result()
+                except (IOError, requests.exceptions.RequestException, ValueError) as e:
+                    print(f"Error al subir el video {video_filename}: {e}")
+                    continue
                 if result['success']:
                     print(f"Video {video_filename} subido con éxito.")
                 else:
                     print(f"Error al subir el video {video_filename}: {result['status_code']}")
                     print("Response:", result['response'])
 
-            if i + batch_size < total_videos:
-                print(f"Esperando {wait_time/3600} horas antes de subir el siguiente lote de videos.")
-                time.sleep(wait_time)  # Espera 5 horas antes de subir el siguiente lote
-
-    def start_uploading_in_background(self, title, description, segments_folder='static/uploads/segments', batch_size=5, wait_time=5*60*60):
-        thread = threading.Thread(target=self.upload_videos_in_batches, args=(title, description, segments_folder, batch_size, wait_time))
+    def start_uploading_in_background(self, title, description, segments_folder='static/uploads/segments', batch_size=5, wait_time=5*60*60, workers=None):
+        thread = threading.Thread(target=self.upload_videos_in_batches, args=(title, description, segments_folder, batch_size, wait_time, workers))
         thread.start()
         return thread
 
     def log_uploaded_video(self, video_filename):
         """Registra un video como subido escribiéndolo en el archivo de registro."""
-        with open(self.log_file, 'a') as log:
+        with self.log_lock, open(self.log_file, 'a') as log:
             log.write(video_filename + '\n')
 
     def get_uploaded_videos(self):
@@ -2,6 +2,7 @@ import boto3
 import requests
 import os
 import logging
+from modules.s3_listing import S3Listing
 
 # Configuración del log
 logging.basicConfig(filename='upload.log', level=logging.INFO,
@@ -22,8 +23,7 @@ class FacebookVideoUploader:
 
     def download_videos_from_s3(self, limit=5):
         """Descarga videos de S3 hasta un límite especificado."""
-        response = self.s3_client.list_objects_v2(Bucket=self.s3_bucket, Prefix=self.s3_folder)
-        video_files = [content['Key'] for content in response.get('Contents', []) if content['Key'].endswith(('.mp4', '.mov'))]
+        video_files = S3Listing(self.s3_bucket, self.s3_client).keys(self.s3_folder, suffixes=('.mp4', '.mov'))
 
         downloaded_videos = []
         for video in video_files[:limit]:
@@ -0,0 +1,133 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+from modules.ffmpeg_utils import run_ffmpeg
+
+class FanoutEncoder:
+    """
+    Decodifica y escala la fuente una sola vez y reparte los frames entre varios
+    encoders ffmpeg, uno por segmento de salida. Al llegar al final de un rango
+    se pasa al siguiente encoder mientras el anterior termina de vaciar su cola,
+    así que hasta max_active_encoders segmentos se codifican a la vez.
+
+    El audio de cada segmento se extrae en un hilo aparte mientras se decodifica
+    el video y se une al final con copia de streams, sin frenar el reparto de frames.
+    """
+
+    def __init__(self, clip, ranges, output_paths, codec='libx264', audio_codec='aac',
+                 preset='medium', max_active_encoders=4, queue_size=64):
+        if len(ranges) != len(output_paths):
+            raise ValueError("Se necesita una ruta de salida por cada rango.")
+        self.clip = clip
+        self.ranges = ranges
+        self.output_paths = output_paths
+        self.codec = codec
+        self.audio_codec = audio_codec
+        self.preset = preset
+        self.queue_size = queue_size
+        self.active_encoders = threading.BoundedSemaphore(max_active_encoders)
+        self.errors = []
+
+    def run(self):
+        fps = self.clip.fps
+        size = self.clip.size
+        threads = {}
+        index = 0
+        frames = None
+
+        # Un solo hilo para el audio: todos los subclips comparten el mismo lector
+        audio_worker = None
+        audio_jobs = [None] * len(self.ranges)
+        if self.clip.audio is not None:
+            audio_worker = ThreadPoolExecutor(max_workers=1)
+            audio_jobs = [audio_worker.submit(self._write_audio, i) for i in range(len(self.ranges))]
+
+        try:
+            for frame_number, frame in enumerate(self.clip.iter_frames(fps=fps, dtype='uint8')):
+                t = frame_number / fps
+                # Rotar al encoder del siguiente rango al cruzar un límite
+                while index < len(self.ranges) and t >= self.ranges[index][1]:
+                    if frames is not None:
+                        frames.put(None)
+                        frames = None
+                    index += 1
+                if index >= len(self.ranges):
+                    break
+                if frames is None and t >= self.ranges[index][0]:
+                    frames, threads[index] = self._start_encoder(index, size, fps, audio_jobs[index])
+                if frames is not None:
+                    frames.put(frame)
+        finally:
+            if frames is not None:
+                frames.put(None)
+            for thread in threads.values():
+                thread.join()
+            if audio_worker is not None:
+                audio_worker.shutdown(wait=True, cancel_futures=True)
+                # Rangos que nunca llegaron a tener encoder (p. ej. tras un error)
+                for job_index, job in enumerate(audio_jobs):
+                    if job_index not in threads and job.done() and not job.cancelled() and job.exception() is None:
+                        self._remove(job.result())
+
+        if self.errors:
+            raise self.errors[0]
+        return self.output_paths
+
+    def _write_audio(self, index):
+        start_time, end_time = self.ranges[index]
+        audiofile = f"{self.output_paths[index]}.audio.m4a"
+        self.clip.audio.subclip(start_time, end_time).write_audiofile(
+            audiofile, codec=self.audio_codec, logger=None)
+        return audiofile
+
+    def _start_encoder(self, index, size, fps, audio_job):
+        output_path = self.output_paths[index]
+        # Sin audio el encoder escribe directamente la salida final
+        video_path = f"{output_path}.video.mp4" if audio_job is not None else output_path
+
+        self.active_encoders.acquire()
+        try:
+            frames = queue.Queue(maxsize=self.queue_size)
+            writer = FFMPEG_VideoWriter(video_path, size, fps, codec=self.codec, preset=self.preset)
+            thread = threading.Thread(target=self._drain,
+                                      args=(writer, frames, output_path, video_path, audio_job), daemon=True)
+            thread.start()
+        except Exception:
+            self.active_encoders.release()
+            raise
+        return frames, thread
+
+    def _drain(self, writer, frames, output_path, video_path, audio_job):
+        drained = False
+        try:
+            try:
+                while True:
+                    frame = frames.get()
+                    if frame is None:
+                        drained = True
+                        break
+                    writer.write_frame(frame)
+            finally:
+                writer.close()
+
+            if audio_job is not None:
+                # Unir el audio ya extraído sin re-codificar nada
+                run_ffmpeg(['-i', video_path, '-i', audio_job.result(), '-map', '0:v:0', '-map', '1:a:0',
+                            '-c', 'copy', '-shortest', output_path])
+        except Exception as e:
+            self.errors.append(e)
+            # Seguir vaciando la cola para no bloquear al decodificador
+            while not drained and frames.get() is not None:
+                pass
+        finally:
+            if audio_job is not None:
+                self._remove(video_path)
+                if audio_job.done() and not audio_job.cancelled() and audio_job.exception() is None:
+                    self._remove(audio_job.result())
+            self.active_encoders.release()
+
+    def _remove(self, path):
+        if os.path.exists(path):
+            os.remove(path)
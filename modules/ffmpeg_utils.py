@@ -0,0 +1,202 @@
+import os
+import json
+import logging
+import subprocess
+from moviepy.config import get_setting
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Tolerancia (en segundos) para comparar marcas de tiempo con keyframes
+KEYFRAME_EPSILON = 0.001
+
+# Perfiles H.264 tal como los informa ffprobe -> nombre que acepta libx264
+X264_PROFILES = {
+    'baseline': 'baseline',
+    'constrained baseline': 'baseline',
+    'main': 'main',
+    'high': 'high',
+    'high 10': 'high10',
+    'high 4:2:2': 'high422',
+    'high 4:4:4 predictive': 'high444',
+}
+
+# Segundos que se decodifican después de la unión para comprobar que el empalme funciona
+SPLICE_CHECK_SECONDS = 2.0
+
+# MP4 normal con el moov al principio: el sondeo de cabecera (MediaProbe) y la lectura
+# por rangos (S3RangeReader) encuentran duración e índice sin bajar el archivo entero.
+# Un MP4 fragmentado no sirve: sin índice global ffmpeg tiene que recorrer todos los
+# fragmentos para saber la duración o buscar un instante
+STREAMABLE_MP4_PARAMS = ['-movflags', '+faststart']
+
+def run_ffmpeg(args):
+    cmd = [get_setting("FFMPEG_BINARY"), '-hide_banner', '-loglevel', 'error', '-y'] + list(args)
+    subprocess.run(cmd, check=True)
+
+def run_ffprobe(args):
+    # ffprobe es una dependencia del sistema (paquete ffmpeg): imageio-ffmpeg, que trae
+    # el ffmpeg de moviepy, no lo incluye. Lo usan los modos 'copy' y MediaProbe
+    cmd = [Config.FFPROBE_BINARY, '-v', 'error', '-of', 'json'] + list(args)
+    result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    return json.loads(result.stdout)
+
+def probe_streams(input_path):
+    """Devuelve la duración y los parámetros del primer stream de video y de audio."""
+    info = run_ffprobe(['-show_format', '-show_streams', input_path])
+    video = next((s for s in info.get('streams', []) if s.get('codec_type') == 'video'), {})
+    audio = next((s for s in info.get('streams', []) if s.get('codec_type') == 'audio'), {})
+    return float(info['format']['duration']), video, audio
+
+def get_keyframe_times(input_path):
+    """Lista los tiempos de los keyframes leyendo solo los paquetes (sin decodificar)."""
+    info = run_ffprobe(['-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags', input_path])
+    return sorted(
+        float(packet['pts_time'])
+        for packet in info.get('packets', [])
+        if 'K' in packet.get('flags', '') and packet.get('pts_time') not in (None, 'N/A')
+    )
+
+def normalized_encode_args(width=720, height=1080, fps=30):
+    # Parámetros fijos para que las piezas de un lote se puedan unir con copia de streams
+    return [
+        '-vf', f"scale={width}:{height},setsar=1,fps={fps}",
+        '-c:v', 'libx264', '-preset', 'medium', '-crf', '20',
+        '-pix_fmt', 'yuv420p', '-profile:v', 'high', '-video_track_timescale', '15360',
+        '-c:a', 'aac', '-ar', '44100', '-ac', '2', '-b:a', '128k'
+    ]
+
+def normalize_video(input_path, output_path, encode_args):
+    """Re-codifica un video con los parámetros dados; agrega audio mudo si no tiene."""
+    # Con el ffmpeg de moviepy (ffmpeg -i), así este camino no necesita ffprobe
+    has_audio = ffmpeg_parse_infos(input_path)['audio_found']
+    args = ['-i', input_path]
+    if has_audio:
+        args += ['-map', '0:v:0', '-map', '0:a:0']
+    else:
+        args += ['-f', 'lavfi', '-i', 'anullsrc=r=44100:cl=stereo', '-map', '0:v:0', '-map', '1:a:0', '-shortest']
+    run_ffmpeg(args + list(encode_args) + [output_path])
+    return output_path
+
+def copy_range(input_path, start, end, output_path, audio_codec='copy', in_band_headers=False):
+    # Con -ss antes de -i y copia de streams, ffmpeg arranca en el keyframe <= start.
+    # in_band_headers (solo H.264) repite SPS/PPS dentro de cada keyframe: el avcC del MP4
+    # solo guarda los del primer tramo al unir este con otro codificado aparte
+    args = [
+        '-ss', f"{start:.6f}", '-i', input_path, '-t', f"{end - start:.6f}",
+        '-map', '0:v:0', '-map', '0:a:0?',
+        '-c:v', 'copy', '-c:a', audio_codec,
+    ]
+    if in_band_headers:
+        # Para empalmar se deja la lista de edición del MP4: con make_zero los B-frames
+        # correrían el primer frame y quedaría un hueco en la unión
+        args += ['-bsf:v', 'h264_mp4toannexb']
+    else:
+        args += ['-avoid_negative_ts', 'make_zero']
+    run_ffmpeg(args + [output_path])
+
+def encode_range(input_path, start, end, output_path, video_stream, match_profile=False):
+    # Re-codifica solo el tramo indicado con parámetros compatibles con el original.
+    # match_profile fija además perfil y nivel H.264 del original y repite SPS/PPS en
+    # cada keyframe (para empalmar con un tramo copiado)
+    args = [
+        '-ss', f"{start:.6f}", '-i', input_path, '-t', f"{end - start:.6f}",
+        '-map', '0:v:0', '-map', '0:a:0?',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18',
+        '-c:a', 'aac'
+    ]
+    if video_stream.get('pix_fmt'):
+        args += ['-pix_fmt', video_stream['pix_fmt']]
+    if video_stream.get('time_base'):
+        args += ['-video_track_timescale', video_stream['time_base'].split('/')[-1]]
+    if match_profile:
+        profile = X264_PROFILES.get(str(video_stream.get('profile', '')).lower())
+        if profile:
+            args += ['-profile:v', profile]
+        if video_stream.get('level', 0) > 0:
+            args += ['-level', f"{video_stream['level'] / 10:.1f}"]
+        args += ['-x264-params', 'repeat-headers=1']
+    run_ffmpeg(args + [output_path])
+
+def decodes_cleanly(path, duration=None):
+    """Decodifica el video de path (los primeros duration segundos) y dice si no hubo errores."""
+    cmd = [get_setting("FFMPEG_BINARY"), '-hide_banner', '-v', 'error', '-xerror', '-i', path]
+    if duration is not None:
+        cmd += ['-t', f"{duration:.6f}"]
+    # Sin conversión de frame rate: solo interesan los errores del decoder
+    result = subprocess.run(cmd + ['-map', '0:v:0', '-vsync', '0', '-f', 'null', '-'], capture_output=True, text=True)
+    if result.returncode != 0 or result.stderr.strip():
+        logger.warning(f"Errores al decodificar {path}: {result.stderr.strip()[:500]}")
+        return False
+    return True
+
+def concat_files(input_paths, output_path):
+    """Une archivos con parámetros idénticos usando el demuxer concat, sin re-codificar."""
+    list_path = f"{output_path}.txt"
+    with open(list_path, 'w') as list_file:
+        for path in input_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            list_file.write(f"file '{escaped}'\n")
+    try:
+        run_ffmpeg(['-f', 'concat', '-safe', '0', '-i', list_path, '-c', 'copy'] + STREAMABLE_MP4_PARAMS + [output_path])
+    finally:
+        os.remove(list_path)
+    return output_path
+
+def segment_copy(input_path, segment_times, output_prefix):
+    """
+    Corta el archivo en una sola pasada con copia de streams. Cada corte cae en el
+    primer keyframe en o después del tiempo pedido; devuelve las piezas en orden.
+    """
+    list_path = f"{output_prefix}_lista.txt"
+    args = [
+        '-i', input_path, '-map', '0:v:0', '-map', '0:a:0?', '-c', 'copy',
+        '-f', 'segment', '-reset_timestamps', '1',
+        '-segment_list', list_path, '-segment_list_type', 'flat'
+    ]
+    if segment_times:
+        args += ['-segment_times', ','.join(f"{t:.3f}" for t in segment_times)]
+    run_ffmpeg(args + [f"{output_prefix}_%05d.mp4"])
+
+    output_dir = os.path.dirname(output_prefix)
+    with open(list_path) as list_file:
+        piezas = [os.path.join(output_dir, line.strip()) for line in list_file if line.strip()]
+    os.remove(list_path)
+    return piezas
+
+def smart_cut(input_path, start, end, output_path, keyframes, video_stream, audio_stream):
+    """
+    Corta [start, end) copiando los streams desde el primer keyframe dentro del rango
+    y re-codificando solo el GOP parcial entre start y ese keyframe. Los dos tramos
+    llevan sus SPS/PPS en banda y el empalme se comprueba decodificándolo; si falla,
+    se re-codifica el corte completo.
+    """
+    next_keyframe = next((k for k in keyframes if k >= start - KEYFRAME_EPSILON), None)
+    audio_codec = 'copy' if audio_stream.get('codec_name') in (None, 'aac') else 'aac'
+
+    if next_keyframe is not None and next_keyframe - start <= KEYFRAME_EPSILON:
+        copy_range(input_path, next_keyframe, end, output_path, audio_codec)
+        return output_path
+
+    # Solo se puede unir un tramo re-codificado con uno copiado si ambos son H.264
+    if next_keyframe is None or next_keyframe >= end or video_stream.get('codec_name') != 'h264':
+        encode_range(input_path, start, end, output_path, video_stream)
+        return output_path
+
+    head_path = f"{output_path}.head.mp4"
+    tail_path = f"{output_path}.tail.mp4"
+    try:
+        encode_range(input_path, start, next_keyframe, head_path, video_stream, match_profile=True)
+        copy_range(input_path, next_keyframe, end, tail_path, audio_codec, in_band_headers=True)
+        concat_files([head_path, tail_path], output_path)
+        if not decodes_cleanly(output_path, next_keyframe - start + SPLICE_CHECK_SECONDS):
+            # El empalme no se decodifica bien: re-codificar el corte completo
+            logger.warning(f"El empalme del corte [{start}, {end}) de {input_path} no se decodifica. "
+                           f"Re-codificando el corte completo.")
+            encode_range(input_path, start, end, output_path, video_stream)
+    finally:
+        for path in (head_path, tail_path):
+            if os.path.exists(path):
+                os.remove(path)
+    return output_path
@@ -0,0 +1,50 @@
+import numpy as np
+from moviepy.editor import ImageClip
+
+class LogoOverlay:
+    """
+    Superpone un logo sobre cada frame mezclando solo el rectángulo que ocupa.
+    El logo se redimensiona y se premultiplica por su alfa (y la opacidad) una sola
+    vez; por frame solo queda una mezcla entera sobre ese rectángulo.
+    """
+
+    def __init__(self, logo_path, frame_size, height=50, opacity=0.5, position=("center", "top")):
+        logo = ImageClip(logo_path, transparent=True).resize(height=height)
+        rgb = logo.get_frame(0)[:, :, :3].astype(np.uint16)
+        if logo.mask is not None:
+            alpha = logo.mask.get_frame(0)
+        else:
+            alpha = np.ones(rgb.shape[:2])
+
+        frame_width, frame_height = frame_size
+        logo_height, logo_width = rgb.shape[:2]
+        x, y = self.resolve_position(position, frame_width, frame_height, logo_width, logo_height)
+
+        # Recortar el logo a los bordes del frame
+        left, top = max(x, 0), max(y, 0)
+        right, bottom = min(x + logo_width, frame_width), min(y + logo_height, frame_height)
+        if right <= left or bottom <= top:
+            raise ValueError("El logo queda fuera del frame.")
+        self.region = (slice(top, bottom), slice(left, right))
+        patch = (slice(top - y, bottom - y), slice(left - x, right - x))
+
+        # Alfa en punto fijo (0..256) para mezclar con enteros
+        alpha = np.rint(np.clip(alpha[patch], 0, 1) * opacity * 256).astype(np.uint16)[:, :, None]
+        self.premultiplied = rgb[patch] * alpha
+        self.inverse_alpha = 256 - alpha
+
+    @staticmethod
+    def resolve_position(position, frame_width, frame_height, logo_width, logo_height):
+        pos_x, pos_y = position
+        anchors_x = {'left': 0, 'center': (frame_width - logo_width) // 2, 'right': frame_width - logo_width}
+        anchors_y = {'top': 0, 'center': (frame_height - logo_height) // 2, 'bottom': frame_height - logo_height}
+        x = anchors_x[pos_x] if isinstance(pos_x, str) else int(pos_x)
+        y = anchors_y[pos_y] if isinstance(pos_y, str) else int(pos_y)
+        return x, y
+
+    def __call__(self, frame):
+        if not frame.flags.writeable:
+            frame = frame.copy()
+        roi = frame[self.region]
+        roi[...] = (roi * self.inverse_alpha + self.premultiplied + 128) >> 8
+        return frame
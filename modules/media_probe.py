@@ -0,0 +1,183 @@
+import os
+import json
+import struct
+import hashlib
+import tempfile
+import threading
+import boto3
+from config import Config
+from modules.ffmpeg_utils import run_ffprobe
+
+# Bytes que se leen del inicio de un objeto para buscar las cajas ftyp/moov
+HEADER_READ_SIZE = 1024 * 1024
+# Bytes de cada extremo del archivo que se usan para el hash de un archivo local
+FILE_HASH_SAMPLE_SIZE = 1024 * 1024
+
+class MediaProbe:
+    """
+    Obtiene duración, fps, resolución, códecs y bitrate de un video sin abrirlo con
+    moviepy. Los resultados se guardan en un JSON en disco, indexados por el ETag del
+    objeto en S3 o por un hash del archivo local. Para objetos de S3 solo se descargan
+    las cajas ftyp y moov del MP4 mediante lecturas por rango.
+    """
+
+    def __init__(self, cache_file=None, s3_client=None):
+        self.cache_file = cache_file or Config.MEDIA_PROBE_CACHE_FILE
+        self.s3_client = s3_client or boto3.client('s3')
+        self.lock = threading.Lock()
+        self.cache = self.load_cache()
+
+    def load_cache(self):
+        if not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, 'r') as f:
+                return json.load(f)
+        except (IOError, ValueError) as e:
+            print(f"Error al leer la caché de metadatos {self.cache_file}: {e}")
+            return {}
+
+    def save_cache(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)), exist_ok=True)
+        tmp_path = f"{self.cache_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.cache, f)
+        os.replace(tmp_path, self.cache_file)
+
+    def remember(self, cache_key, info):
+        with self.lock:
+            self.cache[cache_key] = info
+            self.save_cache()
+        return info
+
+    def probe_file(self, path):
+        cache_key = f"file:{file_hash(path)}"
+        # Las entradas sin duración (de versiones anteriores, que guardaban 0) se vuelven a sondear
+        if cache_key in self.cache and self.cache[cache_key].get('duration'):
+            return self.cache[cache_key]
+        info = summarize(run_ffprobe(['-show_format', '-show_streams', path]), os.path.getsize(path))
+        if info['duration'] is None:
+            raise ValueError(f"ffprobe no informa la duración de {path}")
+        return self.remember(cache_key, info)
+
+    def probe_s3(self, bucket, key, etag=None):
+        """Devuelve los metadatos de un objeto de S3 sin descargarlo completo."""
+        head = None
+        if etag is None:
+            head = self.s3_client.head_object(Bucket=bucket, Key=key)
+            etag = head['ETag']
+        cache_key = f"etag:{etag.strip(chr(34))}"
+        # Las entradas sin duración (de versiones anteriores, que guardaban 0) se vuelven a sondear
+        if cache_key in self.cache and self.cache[cache_key].get('duration'):
+            return self.cache[cache_key]
+
+        if head is None:
+            head = self.s3_client.head_object(Bucket=bucket, Key=key)
+        size = head['ContentLength']
+        header = self.read_mp4_header(bucket, key, size)
+
+        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(key)[1] or '.mp4', delete=False) as tmp:
+            tmp.write(header)
+            tmp_path = tmp.name
+        try:
+            info = summarize(run_ffprobe(['-show_format', '-show_streams', tmp_path]), size)
+        finally:
+            os.remove(tmp_path)
+        if info['duration'] is None:
+            # En un MP4 fragmentado (moov vacío) la duración no está en la cabecera:
+            # hay que recorrer los fragmentos, así que se sondea el objeto completo
+            print(f"La cabecera de {key} no incluye la duración. Sondeando el objeto completo...")
+            info = self.probe_full_object(bucket, key, size)
+        return self.remember(cache_key, info)
+
+    def probe_full_object(self, bucket, key, size):
+        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(key)[1] or '.mp4', delete=False) as tmp:
+            tmp_path = tmp.name
+        try:
+            self.s3_client.download_file(bucket, key, tmp_path)
+            info = summarize(run_ffprobe(['-show_format', '-show_streams', tmp_path]), size)
+        finally:
+            os.remove(tmp_path)
+        if info['duration'] is None:
+            raise ValueError(f"ffprobe no informa la duración de s3://{bucket}/{key}")
+        return info
+
+    def read_range(self, bucket, key, start, end):
+        response = self.s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}")
+        return response['Body'].read()
+
+    def read_mp4_header(self, bucket, key, size):
+        """
+        Recorre las cajas de primer nivel del MP4 leyendo solo sus cabeceras y
+        devuelve ftyp + moov. Si no se encuentra moov, devuelve el inicio del objeto.
+        """
+        head = self.read_range(bucket, key, 0, min(HEADER_READ_SIZE, size) - 1)
+        ftyp = b''
+        offset = 0
+        while offset + 8 <= size:
+            if offset + 16 <= len(head):
+                box_header = head[offset:offset + 16]
+            else:
+                box_header = self.read_range(bucket, key, offset, min(offset + 16, size) - 1)
+            box_size, box_type = struct.unpack('>I4s', box_header[:8])
+            if box_size == 1:
+                box_size = struct.unpack('>Q', box_header[8:16])[0]
+            elif box_size == 0:
+                box_size = size - offset
+            if box_size < 8:
+                break
+
+            if box_type == b'ftyp':
+                ftyp = head[offset:offset + box_size] if offset + box_size <= len(head) else \
+                    self.read_range(bucket, key, offset, offset + box_size - 1)
+            elif box_type == b'moov':
+                if offset + box_size <= len(head):
+                    moov = head[offset:offset + box_size]
+                else:
+                    moov = self.read_range(bucket, key, offset, offset + box_size - 1)
+                return ftyp + moov
+            offset += box_size
+
+        return head
+
+def file_hash(path):
+    """Hash de un archivo local a partir de su tamaño y de sus primeros y últimos bytes."""
+    size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode('utf-8'))
+    with open(path, 'rb') as f:
+        digest.update(f.read(FILE_HASH_SAMPLE_SIZE))
+        if size > FILE_HASH_SAMPLE_SIZE:
+            f.seek(max(size - FILE_HASH_SAMPLE_SIZE, FILE_HASH_SAMPLE_SIZE))
+            digest.update(f.read(FILE_HASH_SAMPLE_SIZE))
+    return digest.hexdigest()
+
+def parse_rate(rate):
+    if not rate or rate in ('0/0', 'N/A'):
+        return None
+    numerator, _, denominator = rate.partition('/')
+    return float(numerator) / float(denominator or 1)
+
+def summarize(ffprobe_info, size):
+    streams = ffprobe_info.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'), {})
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), {})
+    duration = None
+    for value in (ffprobe_info.get('format', {}).get('duration'), video.get('duration')):
+        try:
+            duration = float(value)
+        except (TypeError, ValueError):
+            continue  # Ausente o 'N/A'
+        if duration > 0:
+            break
+        duration = None
+    return {
+        'duration': duration,
+        'fps': parse_rate(video.get('avg_frame_rate')) or parse_rate(video.get('r_frame_rate')),
+        'width': video.get('width'),
+        'height': video.get('height'),
+        'video_codec': video.get('codec_name'),
+        'audio_codec': audio.get('codec_name'),
+        # Calculado con el tamaño real del objeto, no con el de la cabecera leída
+        'bitrate': int(size * 8 / duration) if duration else None,
+        'size': size,
+    }
@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import fcntl
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+
+class RateLimiter:
+    """
+    Cubo de tokens por página: capacity publicaciones de golpe y se recupera una cada
+    refill_period / capacity segundos. El estado (tokens y última actualización) se
+    guarda en state_file bajo flock, así que un reinicio no devuelve el cupo completo
+    y varios procesos que publican en la misma página comparten el mismo cupo.
+    Cada tipo de publicación (kind: 'videos', 'reels'...) tiene su propio cupo por
+    página en el archivo, con sus claves separadas como "kind:page_id".
+    """
+
+    def __init__(self, kind, capacity, refill_period, state_file=None):
+        self.kind = kind
+        self.capacity = capacity
+        self.rate = capacity / refill_period  # Tokens por segundo
+        self.state_file = state_file or Config.PUBLISH_RATE_STATE_FILE
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_file)), exist_ok=True)
+
+    def acquire(self, key):
+        """Bloquea hasta que haya un token para key y lo consume."""
+        announced = False
+        while True:
+            wait = self.try_acquire(key)
+            if wait == 0:
+                return
+            if not announced:
+                print(f"Cupo de publicación de {self.kind} agotado para {key}: siguiente hueco en {wait / 60:.1f} minutos.")
+                announced = True
+            # Se vuelve a mirar el archivo cada poco por si otro proceso cambió el estado
+            time.sleep(min(wait, 60))
+
+    def try_acquire(self, key):
+        """Consume un token si hay; si no, devuelve los segundos que faltan para el siguiente."""
+        key = f"{self.kind}:{key}"
+        with self.lock, open(f"{self.state_file}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            state = self.load_state()
+            now = time.time()
+            bucket = state.get(key, {'tokens': self.capacity, 'updated_at': now})
+            tokens = min(self.capacity, bucket['tokens'] + max(0, now - bucket['updated_at']) * self.rate)
+            if tokens >= 1:
+                state[key] = {'tokens': tokens - 1, 'updated_at': now}
+                self.save_state(state)
+                return 0
+            return (1 - tokens) / self.rate
+
+    def refund(self, key):
+        """Devuelve un token tomado para una publicación que al final no se hizo."""
+        key = f"{self.kind}:{key}"
+        with self.lock, open(f"{self.state_file}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            state = self.load_state()
+            bucket = state.get(key)
+            if bucket is not None:
+                now = time.time()
+                tokens = bucket['tokens'] + max(0, now - bucket['updated_at']) * self.rate
+                state[key] = {'tokens': min(self.capacity, tokens + 1), 'updated_at': now}
+                self.save_state(state)
+
+    def load_state(self):
+        if not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, 'r') as f:
+                return json.load(f)
+        except (IOError, ValueError) as e:
+            print(f"Error al leer el estado del límite de publicación {self.state_file}: {e}")
+            return {}
+
+    def save_state(self, state):
+        tmp_path = f"{self.state_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_file)
+
+class PublishingEngine:
+    """
+    Ejecuta publicaciones en un pool de workers hilos; cada una espera antes un token
+    del RateLimiter de su página. El ritmo lo marca el cupo configurado y no subidas
+    en serie con esperas fijas.
+    """
+
+    def __init__(self, kind, capacity, refill_period, workers=None, state_file=None):
+        self.limiter = RateLimiter(kind, capacity, refill_period, state_file)
+        self.executor = ThreadPoolExecutor(max_workers=workers or Config.PUBLISH_WORKERS)
+
+    def submit(self, page_id, fn, *args, **kwargs):
+        """Programa fn(*args, **kwargs) para cuando la página tenga cupo; devuelve un Future."""
+        return self.executor.submit(self.run, page_id, fn, args, kwargs)
+
+    def acquire(self, page_id):
+        """
+        Toma el token de una publicación por adelantado (p. ej. antes de descargar el
+        archivo); luego se programa con submit_acquired, que no vuelve a esperar.
+        """
+        self.limiter.acquire(page_id)
+
+    def refund(self, page_id):
+        """Devuelve el token de acquire() si la publicación no se llega a programar."""
+        self.limiter.refund(page_id)
+
+    def submit_acquired(self, fn, *args, **kwargs):
+        """Programa fn(*args, **kwargs) con un token ya tomado con acquire(); devuelve un Future."""
+        return self.executor.submit(fn, *args, **kwargs)
+
+    def run(self, page_id, fn, args, kwargs):
+        self.limiter.acquire(page_id)
+        return fn(*args, **kwargs)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
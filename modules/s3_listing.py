@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from botocore.exceptions import ClientError
+from config import Config
+from modules.s3_transfer import s3
+
+class S3Listing:
+    """
+    Lista prefijos de S3 paginando completo (list_objects_v2 devuelve como máximo
+    1000 claves por llamada) y guarda por prefijo un manifiesto local con la clave,
+    tamaño, ETag y fecha de modificación de cada objeto.
+
+    En las ejecuciones siguientes solo se piden las claves posteriores a la última
+    del manifiesto (StartAfter), que es donde S3 coloca las claves nuevas en orden
+    lexicográfico. Como así no se ven borrados, reemplazos ni claves intermedias,
+    se vuelve a listar el prefijo entero cada full_refresh_interval segundos si sus
+    claves crecen en orden (ordered_keys=True, p. ej. con fecha al principio) y cada
+    unordered_refresh_interval si no (reel_{N}_..., combined_video_..., assets subidos
+    a mano), que es lo habitual. Quien descarga una clave listada que ya no existe
+    la quita del manifiesto con forget().
+    """
+
+    def __init__(self, bucket_name=None, s3_client=None, manifest_dir=None, full_refresh_interval=None,
+                 unordered_refresh_interval=None):
+        self.bucket_name = bucket_name or Config.S3_BUCKET_NAME
+        self.s3_client = s3_client or s3
+        self.manifest_dir = manifest_dir or Config.S3_MANIFEST_FOLDER
+        self.full_refresh_interval = (full_refresh_interval if full_refresh_interval is not None
+                                      else Config.S3_MANIFEST_FULL_REFRESH)
+        self.unordered_refresh_interval = (unordered_refresh_interval if unordered_refresh_interval is not None
+                                           else Config.S3_MANIFEST_UNORDERED_FULL_REFRESH)
+        self.lock = threading.Lock()
+        self.manifests = {}
+        os.makedirs(self.manifest_dir, exist_ok=True)
+
+    def manifest_path(self, prefix):
+        digest = hashlib.sha1(f"{self.bucket_name}/{prefix}".encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.manifest_dir, f"{digest}.json")
+
+    def list_objects(self, prefix, refresh='auto', ordered_keys=False):
+        """
+        Devuelve los objetos del prefijo como dicts {'Key', 'Size', 'ETag', 'LastModified'},
+        ordenados por clave. refresh: 'auto' (delta o completo según el intervalo),
+        'full' (listar todo) o 'none' (solo el manifiesto local). ordered_keys indica
+        que las claves nuevas del prefijo siempre van detrás de las existentes.
+        """
+        with self.lock:
+            manifest = self.load_manifest(prefix)
+            if refresh == 'full' or (refresh == 'auto' and self.needs_full_refresh(manifest, ordered_keys)):
+                manifest = self.full_refresh(prefix)
+            elif refresh == 'auto':
+                self.delta_refresh(prefix, manifest)
+            objects = manifest['objects']
+            return [dict(entry, Key=key) for key, entry in sorted(objects.items())]
+
+    def keys(self, prefix, suffixes=None, key_prefix=None, refresh='auto', ordered_keys=False):
+        """
+        Claves del prefijo, filtradas opcionalmente por terminación (p. ej. ('.mp3', '.wav'))
+        y por un subprefijo, respondidas desde el manifiesto.
+        """
+        keys = []
+        for obj in self.list_objects(prefix, refresh=refresh, ordered_keys=ordered_keys):
+            key = obj['Key']
+            if suffixes and not key.endswith(tuple(suffixes)):
+                continue
+            if key_prefix and not key.startswith(key_prefix):
+                continue
+            keys.append(key)
+        return keys
+
+    def needs_full_refresh(self, manifest, ordered_keys=False):
+        interval = self.full_refresh_interval if ordered_keys else self.unordered_refresh_interval
+        return time.time() - manifest.get('last_full_refresh', 0) >= interval
+
+    def forget(self, prefix, key):
+        """Quita del manifiesto una clave que ya no existe en S3 (p. ej. la descarga dio 404)."""
+        with self.lock:
+            manifest = self.load_manifest(prefix)
+            if manifest['objects'].pop(key, None) is not None:
+                self.save_manifest(prefix, manifest)
+
+    @staticmethod
+    def is_missing(error):
+        """Si error es el de una clave que no existe (GetObject o HeadObject)."""
+        return (isinstance(error, ClientError)
+                and error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'))
+
+    def full_refresh(self, prefix):
+        objects = {}
+        for obj in self.paginate(prefix):
+            objects[obj['Key']] = self.entry(obj)
+        manifest = {'bucket': self.bucket_name, 'prefix': prefix, 'objects': objects,
+                    'last_full_refresh': time.time()}
+        self.save_manifest(prefix, manifest)
+        return manifest
+
+    def delta_refresh(self, prefix, manifest):
+        objects = manifest['objects']
+        start_after = max(objects) if objects else None
+        added = 0
+        for obj in self.paginate(prefix, start_after=start_after):
+            objects[obj['Key']] = self.entry(obj)
+            added += 1
+        if added:
+            self.save_manifest(prefix, manifest)
+
+    def paginate(self, prefix, start_after=None):
+        params = {'Bucket': self.bucket_name, 'Prefix': prefix}
+        if start_after:
+            params['StartAfter'] = start_after
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(**params):
+            for obj in page.get('Contents', []):
+                yield obj
+
+    @staticmethod
+    def entry(obj):
+        last_modified = obj.get('LastModified')
+        return {
+            'Size': obj.get('Size'),
+            'ETag': obj.get('ETag'),
+            'LastModified': last_modified.isoformat() if hasattr(last_modified, 'isoformat') else last_modified,
+        }
+
+    def load_manifest(self, prefix):
+        if prefix in self.manifests:
+            return self.manifests[prefix]
+        manifest = {'objects': {}, 'last_full_refresh': 0}
+        path = self.manifest_path(prefix)
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    manifest = json.load(f)
+            except (IOError, ValueError) as e:
+                print(f"Error al leer el manifiesto de {prefix}: {e}")
+        self.manifests[prefix] = manifest
+        return manifest
+
+    def save_manifest(self, prefix, manifest):
+        self.manifests[prefix] = manifest
+        path = self.manifest_path(prefix)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
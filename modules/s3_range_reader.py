@@ -0,0 +1,238 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote
+from botocore.exceptions import ClientError
+from config import Config
+from modules.s3_transfer import s3
+
+RANGE_PATTERN = re.compile(r'bytes=(\d*)-(\d*)')
+
+class S3RangeReader:
+    """
+    Lee un objeto de S3 por bloques con GETs por rango (fijados al ETag con IfMatch).
+    Guarda como mucho max_blocks bloques en una LRU y, mientras la lectura sea
+    secuencial, pide en segundo plano hasta readahead bloques por delante, así el
+    decoder casi nunca espera a la red. Las lecturas sueltas (sondeo del índice,
+    saltos de ffmpeg) no piden nada por delante.
+    Si un bloque no se puede leer tras max_retries intentos, el error queda en
+    self.error: ffmpeg solo ve un corte de conexión (y moviepy repite el último
+    frame), así que quien renderiza tiene que comprobarlo (S3RangeServer.check).
+    """
+
+    def __init__(self, bucket, key, block_size=None, max_blocks=None, readahead=None, max_retries=None):
+        self.bucket = bucket
+        self.key = key
+        self.block_size = block_size or Config.S3_RANGE_BLOCK_SIZE
+        self.readahead = readahead if readahead is not None else Config.S3_RANGE_READAHEAD
+        self.max_retries = max(1, max_retries or Config.S3_RANGE_RETRIES)
+        # Siempre caben el bloque que se lee y los que se piden por delante
+        self.max_blocks = max(max_blocks or Config.S3_RANGE_CACHE_BLOCKS, self.readahead + 1)
+        head = s3.head_object(Bucket=bucket, Key=key)
+        self.size = head['ContentLength']
+        self.etag = head['ETag']
+        self.executor = ThreadPoolExecutor(max_workers=max(1, self.readahead))
+        self.blocks = OrderedDict()  # índice de bloque -> Future con sus bytes
+        self.lock = threading.Lock()
+        self.bytes_fetched = 0
+        self.error = None
+
+    def read(self, offset, length, readahead=0):
+        """
+        Devuelve hasta length bytes desde offset (menos si se llega al final) y pide
+        min(readahead, self.readahead) bloques siguientes en segundo plano.
+        """
+        end = min(offset + length, self.size)
+        chunks = []
+        while offset < end:
+            index = offset // self.block_size
+            block = self.get_block(index, min(readahead, self.readahead))
+            start = offset - index * self.block_size
+            chunk = block[start:start + end - offset]
+            chunks.append(chunk)
+            offset += len(chunk)
+        return b''.join(chunks)
+
+    def get_block(self, index, readahead=0):
+        with self.lock:
+            future = self.request_block(index)
+            last_block = (self.size - 1) // self.block_size
+            for ahead in range(index + 1, min(index + readahead, last_block) + 1):
+                self.request_block(ahead)
+            self.evict()
+        try:
+            return future.result()
+        except Exception:
+            # No dejar el fallo en la caché: la siguiente lectura vuelve a pedir el bloque
+            with self.lock:
+                if self.blocks.get(index) is future:
+                    del self.blocks[index]
+            raise
+
+    def request_block(self, index):
+        # Se llama con self.lock tomado
+        future = self.blocks.get(index)
+        if future is None:
+            future = self.executor.submit(self.fetch_block, index)
+            self.blocks[index] = future
+        self.blocks.move_to_end(index)
+        return future
+
+    def evict(self):
+        # Se llama con self.lock tomado; los bloques que aún se están descargando no se tocan
+        for index in list(self.blocks):
+            if len(self.blocks) <= self.max_blocks:
+                break
+            if self.blocks[index].done():
+                del self.blocks[index]
+
+    def fetch_block(self, index):
+        start = index * self.block_size
+        end = min(start + self.block_size, self.size) - 1
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                response = s3.get_object(Bucket=self.bucket, Key=self.key, Range=f"bytes={start}-{end}", IfMatch=self.etag)
+                data = response['Body'].read()
+                if len(data) != end - start + 1:
+                    raise IOError(f"Bloque {index} de {self.key} incompleto: {len(data)} de {end - start + 1} bytes")
+                break
+            except Exception as e:
+                if isinstance(e, ClientError) and e.response.get('Error', {}).get('Code') == 'PreconditionFailed':
+                    raise  # El objeto cambió mientras se leía: reintentar no sirve
+                if attempt == self.max_retries:
+                    raise
+                print(f"Error leyendo el bloque {index} de {self.key} (intento {attempt}): {e}. Reintentando...")
+                time.sleep(0.5 * 2 ** (attempt - 1))
+        with self.lock:
+            self.bytes_fetched += len(data)
+        return data
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        with self.lock:
+            self.blocks.clear()
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    """Sirve los objetos de S3 con soporte de Range, que es lo que ffmpeg usa para buscar."""
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def respond(self, send_body):
+        try:
+            reader = self.server.range_server.reader(unquote(self.path.lstrip('/')))
+        except Exception as e:
+            self.send_error(404, str(e))
+            return
+
+        start, end = 0, reader.size - 1
+        match = RANGE_PATTERN.fullmatch(self.headers.get('Range', '').strip())
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                if match.group(2):
+                    end = min(int(match.group(2)), reader.size - 1)
+            else:
+                # bytes=-N: los últimos N bytes (donde suele estar el moov)
+                start = max(0, reader.size - int(match.group(2)))
+            if start >= reader.size:
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{reader.size}")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{end}/{reader.size}")
+        else:
+            self.send_response(200)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        if not send_body:
+            return
+
+        position = start
+        blocks_sent = 0
+        try:
+            while position <= end:
+                # La lectura anticipada crece con cada bloque que ffmpeg consume de esta
+                # petición: un sondeo o un salto que se corta enseguida no arrastra bloques
+                chunk = reader.read(position, min(reader.block_size, end + 1 - position), readahead=blocks_sent)
+                self.wfile.write(chunk)
+                position += len(chunk)
+                blocks_sent += 1
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # ffmpeg cierra la conexión al buscar a otra posición
+        except Exception as e:
+            # La respuesta ya está a medias: se corta y el render lo detecta con check()
+            print(f"Error sirviendo {reader.key} por rangos: {e}")
+            if reader.error is None:
+                reader.error = e
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+class S3RangeServer:
+    """
+    Servidor HTTP local que expone objetos de S3 para que ffmpeg/moviepy los decodifiquen
+    sin descargarlos: ffmpeg lee el índice (moov) y salta al rango de bytes del fragmento
+    con peticiones Range, que aquí se resuelven con un S3RangeReader por objeto.
+    """
+
+    def __init__(self, bucket_name=None):
+        self.bucket_name = bucket_name or Config.S3_BUCKET_NAME
+        self.readers = {}
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), RangeRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.range_server = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def url(self, s3_key):
+        """URL local del objeto; se le puede pasar a VideoFileClip en lugar de una ruta."""
+        return f"http://127.0.0.1:{self.httpd.server_port}/{quote(s3_key)}"
+
+    def reader(self, s3_key):
+        with self.lock:
+            if s3_key not in self.readers:
+                self.readers[s3_key] = S3RangeReader(self.bucket_name, s3_key)
+            return self.readers[s3_key]
+
+    def check(self, s3_key):
+        """
+        Lanza IOError si alguna lectura del objeto falló: ffmpeg habrá recibido datos
+        cortados y lo renderizado con él no sirve (frames congelados).
+        """
+        with self.lock:
+            reader = self.readers.get(s3_key)
+        if reader is not None and reader.error is not None:
+            raise IOError(f"Falló la lectura por rangos de {s3_key}: {reader.error}") from reader.error
+
+    def release(self, s3_key):
+        """Libera los bloques de un objeto que ya no se va a leer e informa lo descargado."""
+        with self.lock:
+            reader = self.readers.pop(s3_key, None)
+        if reader is not None:
+            reader.close()
+            print(f"Leído {s3_key} por rangos: {reader.bytes_fetched / (1024 * 1024):.1f} MB "
+                  f"de {reader.size / (1024 * 1024):.1f} MB descargados")
+
+    def close(self):
+        for s3_key in list(self.readers):
+            self.release(s3_key)
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
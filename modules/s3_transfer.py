@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import ClientError
+from config import Config
+
+# Tamaño de cada lectura del cuerpo de una parte (para el límite de ancho de banda)
+READ_SIZE = 1024 * 1024
+# Carpeta en disco para las salidas que no caben (o no se piden) en memoria
+DISK_OUTPUT_FOLDER = '/tmp'
+
+# Cliente compartido por todos los scripts; con conexiones suficientes para las partes en paralelo
+s3 = boto3.client('s3', config=BotoConfig(max_pool_connections=max(10, Config.S3_MAX_CONCURRENCY * 2)))
+
+transfer_config = TransferConfig(
+    multipart_threshold=Config.S3_MULTIPART_THRESHOLD,
+    multipart_chunksize=Config.S3_MULTIPART_CHUNKSIZE,
+    max_concurrency=Config.S3_MAX_CONCURRENCY,
+    max_bandwidth=Config.S3_MAX_BANDWIDTH or None,
+)
+
+class BandwidthLimiter:
+    """Cubo de tokens compartido por los hilos de una descarga: limita los bytes por segundo."""
+
+    def __init__(self, bytes_per_second):
+        self.rate = bytes_per_second
+        self.tokens = bytes_per_second
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= amount or self.tokens >= self.rate:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+def report_throughput(action, key, size, elapsed):
+    megabytes = size / (1024 * 1024)
+    print(f"{action} {key}: {megabytes:.1f} MB en {elapsed:.1f}s ({megabytes / max(elapsed, 1e-6):.1f} MB/s)")
+
+def upload_file(local_path, bucket, key, extra_args=None):
+    """Sube un archivo con multipart en paralelo según la configuración de S3 de Config."""
+    started = time.monotonic()
+    s3.upload_file(local_path, bucket, key, ExtraArgs=extra_args, Config=transfer_config)
+    report_throughput("Subido", key, os.path.getsize(local_path), time.monotonic() - started)
+
+def output_folder(expected_size=None):
+    """
+    Carpeta donde escribir una salida que se va a subir y borrar. Con ENCODE_IN_MEMORY es
+    MEMORY_OUTPUT_FOLDER (tmpfs) si tiene libre al menos expected_size y MEMORY_OUTPUT_MIN_FREE;
+    si no, o si está desactivado, DISK_OUTPUT_FOLDER.
+    """
+    if not Config.ENCODE_IN_MEMORY:
+        return DISK_OUTPUT_FOLDER
+    needed = max(expected_size or 0, Config.MEMORY_OUTPUT_MIN_FREE)
+    try:
+        free = shutil.disk_usage(Config.MEMORY_OUTPUT_FOLDER).free
+    except OSError:
+        free = 0
+    if free < needed:
+        print(f"{Config.MEMORY_OUTPUT_FOLDER} tiene {free / (1024 * 1024):.0f} MB libres y se necesitan "
+              f"{needed / (1024 * 1024):.0f} MB. Escribiendo en {DISK_OUTPUT_FOLDER}.")
+        return DISK_OUTPUT_FOLDER
+    return Config.MEMORY_OUTPUT_FOLDER
+
+def upload_output(bucket, key, produce, expected_size=None):
+    """
+    Llama a produce(ruta) con una ruta en output_folder(expected_size), sube el archivo
+    con upload_file y lo borra. La subida empieza cuando produce termina: la memoria
+    solo ahorra la escritura y la lectura en disco.
+    """
+    temp_dir = tempfile.mkdtemp(prefix='output_', dir=output_folder(expected_size))
+    output_path = os.path.join(temp_dir, os.path.basename(key))
+    try:
+        produce(output_path)
+        upload_file(output_path, bucket, key)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return f"s3://{bucket}/{key}"
+
+def download_file(bucket, key, local_path):
+    """
+    Descarga un objeto. Los objetos por encima del umbral de multipart se bajan por
+    rangos en paralelo a un archivo .part, guardando qué partes están completas; si
+    la descarga se interrumpe, la siguiente llamada solo baja las partes que faltan.
+    """
+    started = time.monotonic()
+    head = s3.head_object(Bucket=bucket, Key=key)
+    size = head['ContentLength']
+    if size <= Config.S3_MULTIPART_THRESHOLD:
+        s3.download_file(bucket, key, local_path, Config=transfer_config)
+    else:
+        try:
+            download_ranges(bucket, key, local_path, size, head['ETag'])
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'PreconditionFailed':
+                raise
+            # El objeto cambió a mitad de la descarga: empezar de cero con la versión nueva
+            print(f"{key} cambió en S3 durante la descarga. Reiniciando.")
+            discard_partial(local_path)
+            head = s3.head_object(Bucket=bucket, Key=key)
+            size = head['ContentLength']
+            download_ranges(bucket, key, local_path, size, head['ETag'])
+    report_throughput("Descargado", key, size, time.monotonic() - started)
+
+def download_ranges(bucket, key, local_path, size, etag):
+    part_path = f"{local_path}.part"
+    state_path = f"{local_path}.part.json"
+    chunk_size = Config.S3_MULTIPART_CHUNKSIZE
+
+    state = load_state(state_path)
+    if (state is None or state.get('etag') != etag or state.get('size') != size
+            or state.get('chunk_size') != chunk_size or not os.path.exists(part_path)):
+        state = {'etag': etag, 'size': size, 'chunk_size': chunk_size, 'done': []}
+        with open(part_path, 'wb') as part_file:
+            part_file.truncate(size)
+        save_state(state_path, state)
+    elif state['done']:
+        print(f"Reanudando {key}: {len(state['done'])} partes ya descargadas.")
+
+    done = set(state['done'])
+    pending = [offset for offset in range(0, size, chunk_size) if offset // chunk_size not in done]
+    limiter = BandwidthLimiter(Config.S3_MAX_BANDWIDTH) if Config.S3_MAX_BANDWIDTH else None
+    lock = threading.Lock()
+
+    fd = os.open(part_path, os.O_WRONLY)
+    try:
+        def fetch(offset):
+            end = min(offset + chunk_size, size) - 1
+            response = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={offset}-{end}", IfMatch=etag)
+            position = offset
+            for chunk in iter(lambda: response['Body'].read(READ_SIZE), b''):
+                if limiter is not None:
+                    limiter.consume(len(chunk))
+                os.pwrite(fd, chunk, position)
+                position += len(chunk)
+            if position != end + 1:
+                raise IOError(f"Parte incompleta de {key} en {offset}: {position - offset} bytes")
+            with lock:
+                done.add(offset // chunk_size)
+                state['done'] = sorted(done)
+                save_state(state_path, state)
+
+        with ThreadPoolExecutor(max_workers=Config.S3_MAX_CONCURRENCY) as executor:
+            # list() para que se propague la primera excepción
+            list(executor.map(fetch, pending))
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+    os.replace(part_path, local_path)
+    os.remove(state_path)
+
+def load_state(state_path):
+    if not os.path.exists(state_path):
+        return None
+    try:
+        with open(state_path, 'r') as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+def save_state(state_path, state):
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+
+def discard_partial(local_path):
+    for path in (f"{local_path}.part", f"{local_path}.part.json"):
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,43 @@
+import numpy as np
+
+class SubtitleTimeline:
+    """
+    Precompila, para cada frame, qué subtítulo está activo y qué palabra se
+    resalta, de modo que la búsqueda por frame sea O(1).
+
+    La palabra resaltada sale de repartir a partes iguales la duración del
+    subtítulo entre sus palabras; no se usan tiempos reales por palabra. Es exacto
+    porque los SRT que generamos (json_to_srt, words_to_srt) llevan una sola palabra
+    por subtítulo: con varias palabras el resaltado es solo una aproximación.
+    """
+
+    def __init__(self, subtitles, fps, duration):
+        self.fps = fps
+        self.texts = [subtitle.text for subtitle in subtitles]
+        frame_count = int(np.ceil(duration * fps)) + 1
+        frame_times_ms = np.arange(frame_count) * (1000.0 / fps)
+        self.cue_by_frame = np.full(frame_count, -1, dtype=np.int32)
+        self.word_by_frame = np.zeros(frame_count, dtype=np.int32)
+
+        # Se recorre en orden inverso para que, si se solapan, gane el primero
+        for cue_index in range(len(subtitles) - 1, -1, -1):
+            subtitle = subtitles[cue_index]
+            start_ms, end_ms = subtitle.start.ordinal, subtitle.end.ordinal
+            first = np.searchsorted(frame_times_ms, start_ms, side='left')
+            last = np.searchsorted(frame_times_ms, end_ms, side='left')
+            word_count = len(subtitle.text.split())
+            if last <= first or word_count == 0:
+                continue
+            elapsed = (frame_times_ms[first:last] - start_ms) / max(end_ms - start_ms, 1)
+            self.cue_by_frame[first:last] = cue_index
+            self.word_by_frame[first:last] = np.minimum((elapsed * word_count).astype(np.int32), word_count - 1)
+
+    def lookup(self, t):
+        """Devuelve (texto, índice de palabra) activos en t, o None."""
+        frame_index = int(t * self.fps + 1e-6)
+        if frame_index < 0 or frame_index >= len(self.cue_by_frame):
+            return None
+        cue_index = self.cue_by_frame[frame_index]
+        if cue_index < 0:
+            return None
+        return self.texts[cue_index], int(self.word_by_frame[frame_index])
@@ -0,0 +1,103 @@
+import os
+import json
+import hashlib
+import threading
+import boto3
+from botocore.exceptions import ClientError
+from config import Config
+
+class TranscriptCache:
+    """
+    Guarda las palabras con tiempos ya transcritas de un tramo de un archivo de voz.
+    La clave es un hash de (ETag del objeto de voz, inicio, fin, idioma, motor), así que un
+    cambio en el archivo de voz invalida sus entradas. Se guarda en disco y, si se
+    indica un prefijo de S3, también en el bucket para compartirlo entre máquinas.
+    """
+
+    def __init__(self, cache_dir=None, s3_prefix=None, bucket_name=None, s3_client=None):
+        self.cache_dir = cache_dir or Config.TRANSCRIPT_CACHE_FOLDER
+        self.s3_prefix = s3_prefix if s3_prefix is not None else Config.TRANSCRIPT_CACHE_S3_PREFIX
+        self.bucket_name = bucket_name or Config.S3_BUCKET_NAME
+        self.s3_client = s3_client or (boto3.client('s3') if self.s3_prefix else None)
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'local_hits': 0, 's3_hits': 0, 'misses': 0}
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def cache_key(etag, start, end, language, engine='aws'):
+        # Tiempos redondeados a milisegundos para que 12.3 y 12.300000001 coincidan
+        key = [etag.strip('"'), round(float(start), 3), round(float(end), 3), language]
+        if engine != 'aws':
+            # Cada motor da tiempos distintos; las claves de Transcribe se mantienen como estaban
+            key.append(engine)
+        payload = json.dumps(key)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def local_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def s3_key(self, key):
+        return f"{self.s3_prefix.rstrip('/')}/{key}.json"
+
+    def get(self, key):
+        """Devuelve la lista de palabras guardada para la clave, o None si no está."""
+        words = self.read_local(key)
+        if words is not None:
+            self.count('hits', 'local_hits')
+            return words
+
+        if self.s3_client is not None:
+            try:
+                response = self.s3_client.get_object(Bucket=self.bucket_name, Key=self.s3_key(key))
+                words = json.loads(response['Body'].read())
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') not in ('NoSuchKey', '404'):
+                    print(f"Error al leer la transcripción {key} de S3: {e}")
+            else:
+                self.write_local(key, words)
+                self.count('hits', 's3_hits')
+                return words
+
+        self.count('misses')
+        return None
+
+    def put(self, key, words):
+        self.write_local(key, words)
+        if self.s3_client is not None:
+            try:
+                self.s3_client.put_object(Bucket=self.bucket_name, Key=self.s3_key(key),
+                                          Body=json.dumps(words).encode('utf-8'),
+                                          ContentType='application/json')
+            except ClientError as e:
+                print(f"Error al guardar la transcripción {key} en S3: {e}")
+
+    def read_local(self, key):
+        path = self.local_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (IOError, ValueError) as e:
+            print(f"Entrada de caché de transcripciones corrupta {path}: {e}")
+            return None
+
+    def write_local(self, key, words):
+        path = self.local_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(words, f)
+        os.replace(tmp_path, path)
+
+    def count(self, *names):
+        with self.lock:
+            for name in names:
+                self.stats[name] += 1
+
+    def summary(self):
+        with self.lock:
+            stats = dict(self.stats)
+        total = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / total * 100 if total else 0
+        return (f"Caché de transcripciones: {stats['hits']} aciertos ({stats['local_hits']} locales, "
+                f"{stats['s3_hits']} de S3), {stats['misses']} fallos ({ratio:.0f}% de aciertos)")
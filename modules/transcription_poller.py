@@ -0,0 +1,203 @@
+import time
+import heapq
+import collections
+import random
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from botocore.exceptions import BotoCoreError, ClientError
+from config import Config
+
+# Errores de la API que indican que hay que bajar el ritmo, no que el trabajo falló
+THROTTLING_ERRORS = ('ThrottlingException', 'LimitExceededException', 'TooManyRequestsException')
+# Ritmo mínimo de consultas (por segundo) al que se puede bajar por throttling
+MIN_CALL_RATE = 1.0
+# Tiempo mínimo entre dos reducciones seguidas del ritmo (segundos)
+THROTTLE_WINDOW = 1.0
+
+class TranscriptionPoller:
+    """
+    Sigue muchos trabajos de Amazon Transcribe desde un solo hilo planificador.
+    Cada trabajo se consulta con un intervalo que crece (backoff) desde min_interval
+    hasta max_interval, con jitter para que las consultas no se sincronicen. Nunca hay
+    más de max_concurrent_polls llamadas a get_transcription_job en vuelo y, si la API
+    responde con throttling, se espacian todas las consultas (y se vuelve a acelerar
+    poco a poco con cada respuesta correcta). Un trabajo cuya consulta falla por red
+    max_network_errors veces seguidas se da por fallido.
+    submit() devuelve un Future que se resuelve con la URI de la transcripción.
+    """
+
+    def __init__(self, transcribe_client, max_concurrent_polls=None, min_interval=None,
+                 max_interval=None, backoff=1.5, jitter=0.25, max_network_errors=None):
+        self.client = transcribe_client
+        self.max_concurrent_polls = max_concurrent_polls or Config.TRANSCRIBE_MAX_CONCURRENT_POLLS
+        self.min_interval = min_interval if min_interval is not None else Config.TRANSCRIBE_POLL_MIN_INTERVAL
+        self.max_interval = max_interval if max_interval is not None else Config.TRANSCRIBE_POLL_MAX_INTERVAL
+        self.backoff = backoff
+        self.jitter = jitter
+        self.max_network_errors = max_network_errors or Config.TRANSCRIBE_POLL_MAX_NETWORK_ERRORS
+
+        self.jobs = {}  # nombre del trabajo -> {'future', 'interval'}
+        self.schedule = []  # heap de (momento de la próxima consulta, secuencia, nombre)
+        self.sequence = 0
+        self.in_flight = 0
+        self.call_rate = None  # Consultas por segundo permitidas; None = sin límite hasta el primer throttling
+        self.recent_calls = collections.deque()
+        self.next_call_at = 0.0
+        self.last_slow_down = 0.0
+        self.closed = False
+        self.stats = {'polls': 0, 'throttled': 0, 'completed': 0, 'failed': 0}
+        self.condition = threading.Condition()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrent_polls)
+        self.thread = None
+
+    def submit(self, job_name, callback=None):
+        """
+        Empieza a seguir un trabajo. callback(job_name, future), si se indica, se llama
+        al terminar. Volver a enviar un trabajo ya seguido devuelve el mismo Future.
+        """
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("El poller de transcripciones está cerrado.")
+            job = self.jobs.get(job_name)
+            if job is None:
+                job = {'future': Future(), 'interval': self.min_interval, 'network_errors': 0}
+                self.jobs[job_name] = job
+                self.schedule_poll(job_name, self.min_interval)
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.run, daemon=True)
+                    self.thread.start()
+                self.condition.notify()
+        if callback is not None:
+            job['future'].add_done_callback(lambda future: callback(job_name, future))
+        return job['future']
+
+    def wait(self, job_name, timeout=None):
+        """Bloquea hasta que el trabajo termine y devuelve la URI de su transcripción."""
+        return self.submit(job_name).result(timeout)
+
+    def close(self):
+        """Deja de consultar; los trabajos que quedaban pendientes fallan con RuntimeError."""
+        with self.condition:
+            self.closed = True
+            pending = list(self.jobs.items())
+            self.jobs.clear()
+            self.condition.notify_all()
+        for job_name, job in pending:
+            job['future'].set_exception(RuntimeError(
+                f"El poller de transcripciones se cerró antes de terminar {job_name}."))
+        self.executor.shutdown(wait=True)
+
+    def schedule_poll(self, job_name, interval):
+        # Jitter proporcional para repartir las consultas de trabajos lanzados a la vez
+        delay = interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+        self.sequence += 1
+        heapq.heappush(self.schedule, (time.monotonic() + delay, self.sequence, job_name))
+
+    def run(self):
+        while True:
+            with self.condition:
+                while True:
+                    if self.closed:
+                        return
+                    now = time.monotonic()
+                    if self.in_flight >= self.max_concurrent_polls:
+                        timeout = None  # Esperar a que termine alguna consulta
+                    elif not self.schedule:
+                        timeout = None
+                    elif max(self.schedule[0][0], self.next_call_at) <= now:
+                        break
+                    else:
+                        timeout = max(self.schedule[0][0], self.next_call_at) - now
+                    self.condition.wait(timeout)
+                _, _, job_name = heapq.heappop(self.schedule)
+                self.in_flight += 1
+                self.recent_calls.append(now)
+                if self.call_rate:
+                    self.next_call_at = now + 1 / self.call_rate
+                # Dentro del candado: close() no puede apagar el executor entre medias
+                self.executor.submit(self.poll, job_name)
+
+    def poll(self, job_name):
+        with self.condition:
+            job = self.jobs.get(job_name)
+            if job is None:
+                # close() ya resolvió el trabajo
+                self.in_flight -= 1
+                return
+        try:
+            response = self.client.get_transcription_job(TranscriptionJobName=job_name)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in THROTTLING_ERRORS:
+                self.reschedule(job_name, job, throttled=True)
+            else:
+                self.finish(job_name, job, exception=e)
+        except BotoCoreError as e:
+            # Errores de red: se reintenta con el mismo backoff, pero no para siempre
+            job['network_errors'] += 1
+            if job['network_errors'] >= self.max_network_errors:
+                self.finish(job_name, job, exception=e)
+            else:
+                self.reschedule(job_name, job)
+        except Exception as e:
+            self.finish(job_name, job, exception=e)
+        else:
+            job['network_errors'] = 0
+            transcription_job = response['TranscriptionJob']
+            status = transcription_job['TranscriptionJobStatus']
+            if status == 'COMPLETED':
+                self.finish(job_name, job, result=transcription_job['Transcript']['TranscriptFileUri'])
+            elif status == 'FAILED':
+                reason = transcription_job.get('FailureReason', 'unknown reason')
+                self.finish(job_name, job, exception=Exception(f"Transcription job {job_name} failed: {reason}"))
+            else:
+                self.reschedule(job_name, job)
+
+    def reschedule(self, job_name, job, throttled=False):
+        with self.condition:
+            self.stats['polls'] += 1
+            if throttled:
+                self.stats['throttled'] += 1
+                self.slow_down()
+                job['interval'] = min(job['interval'] * self.backoff * 2, self.max_interval)
+            else:
+                self.speed_up()
+                job['interval'] = min(job['interval'] * self.backoff, self.max_interval)
+            self.schedule_poll(job_name, job['interval'])
+            self.in_flight -= 1
+            self.condition.notify()
+
+    def slow_down(self):
+        # Reducción multiplicativa del ritmo, una vez por ráfaga: las consultas
+        # que ya estaban en vuelo también pueden volver con throttling
+        now = time.monotonic()
+        if now - self.last_slow_down < THROTTLE_WINDOW:
+            return
+        self.last_slow_down = now
+        while self.recent_calls and self.recent_calls[0] < now - THROTTLE_WINDOW:
+            self.recent_calls.popleft()
+        observed_rate = len(self.recent_calls) / THROTTLE_WINDOW
+        current_rate = min(self.call_rate or observed_rate, observed_rate or MIN_CALL_RATE)
+        self.call_rate = max(current_rate / 2, MIN_CALL_RATE)
+
+    def speed_up(self):
+        # Aumento aditivo: con call_rate respuestas por segundo sube ~1 consulta/s cada segundo
+        if self.call_rate:
+            self.call_rate += 1 / self.call_rate
+        while len(self.recent_calls) > 1000:
+            self.recent_calls.popleft()
+
+    def finish(self, job_name, job, result=None, exception=None):
+        with self.condition:
+            self.stats['polls'] += 1
+            self.speed_up()
+            self.in_flight -= 1
+            self.condition.notify()
+            if self.jobs.get(job_name) is not job:
+                return  # close() ya lo resolvió
+            self.stats['failed' if exception is not None else 'completed'] += 1
+            del self.jobs[job_name]
+        # El Future se resuelve fuera del candado: los callbacks pueden enviar otros trabajos
+        if exception is not None:
+            job['future'].set_exception(exception)
+        else:
+            job['future'].set_result(result)
@@ -1,39 +1,126 @@
 import os
 import random
-import boto3
-from moviepy.editor import VideoFileClip, concatenate_videoclips, AudioFileClip, CompositeVideoClip, ImageClip
+from concurrent.futures import ProcessPoolExecutor
+from moviepy.editor import VideoFileClip, concatenate_videoclips, AudioFileClip
 from moviepy.audio.fx.all import audio_loop
 from config import Config
-
-s3 = boto3.client('s3')
+from modules.ffmpeg_utils import (probe_streams, get_keyframe_times, smart_cut, concat_files, segment_copy, normalize_video,
+                                  normalized_encode_args, STREAMABLE_MP4_PARAMS)
+from modules.bumper_cache import BumperCache
+from modules.logo_overlay import LogoOverlay
+from modules.fanout_encoder import FanoutEncoder
+from modules.s3_transfer import upload_file, upload_output
 
 def upload_to_s3(file_path, s3_folder):
     s3_key = f"{s3_folder}/{os.path.basename(file_path)}"
-    s3.upload_file(file_path, Config.S3_BUCKET_NAME, s3_key)
+    upload_file(file_path, Config.S3_BUCKET_NAME, s3_key)
     os.remove(file_path)  # Elimina el archivo local después de subirlo
     return f"s3://{Config.S3_BUCKET_NAME}/{s3_key}"
 
-def cortar_video(input_video_path, duracion_segmento):
-    video = VideoFileClip(input_video_path).resize((720, 1080))
-    duracion_total = int(video.duration)
+def encode_to_s3(output_filename, s3_folder, produce, expected_size=None):
+    """
+    Genera una salida con produce(ruta, streamable), la sube a S3 en s3_folder y la borra.
+    Con ENCODE_IN_MEMORY la ruta está en tmpfs si hay sitio (ver upload_output) y se pide
+    streamable=True (MP4 con faststart): reescribir el archivo para mover el moov cuesta
+    poco en memoria y deja el video listo para leerlo por rangos desde S3.
+    """
+    s3_key = f"{s3_folder}/{output_filename}"
+    return upload_output(Config.S3_BUCKET_NAME, s3_key, lambda path: produce(path, Config.ENCODE_IN_MEMORY),
+                         expected_size)
+
+def write_videofile(clip, output_path, streamable, **kwargs):
+    if streamable:
+        # El audio temporal de moviepy va junto a la salida en vez de al directorio actual
+        kwargs.update(temp_audiofile=f"{output_path}.m4a", ffmpeg_params=STREAMABLE_MP4_PARAMS)
+    clip.write_videofile(output_path, **kwargs)
+
+def cortar_video(input_video_path, duracion_segmento, mode="reencode"):
+    if mode == "copy":
+        return cortar_video_copy(input_video_path, duracion_segmento)
+    if mode == "fanout":
+        return cortar_video_fanout(input_video_path, duracion_segmento)
+
+    with VideoFileClip(input_video_path) as video:
+        duracion_total = int(video.duration)
+
+    start_times = list(range(0, duracion_total, duracion_segmento))
+    end_times = [min(start_time + duracion_segmento, duracion_total) for start_time in start_times]
+    workers = max(1, min(Config.SEGMENT_WORKERS, len(start_times)))
+    segments = []
+
+    # Cada worker renderiza su rango; map devuelve los resultados en orden
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        rendered = executor.map(render_segment, [input_video_path] * len(start_times), start_times, end_times, [workers] * len(start_times))
+        for output_path in rendered:
+            # Subir a S3 en la subcarpeta 'segments'
+            s3_url = upload_to_s3(output_path, 'segments')
+            segments.append(s3_url)
+
+    return segments
+
+def render_segment(input_video_path, start_time, end_time, workers=1):
+    # Se ejecuta en un proceso del pool: abre su propio lector sobre el archivo fuente
+    output_filename = f"segmento_{start_time}_{end_time}.mp4"
+    output_path = f"/tmp/{output_filename}"  # Guardar temporalmente en el sistema de archivos local
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    with VideoFileClip(input_video_path) as video:
+        clip = video.subclip(start_time, end_time).resize((720, 1080))
+        clip.write_videofile(output_path, codec='libx264', audio_codec='aac', threads=threads, logger=None)
+
+    return output_path
+
+def cortar_video_copy(input_video_path, duracion_segmento):
+    # Copia los streams sin decodificar; solo el GOP parcial de cada corte se re-codifica.
+    # Los segmentos conservan la resolución original (no se redimensionan a 720x1080).
+    duracion, video_stream, audio_stream = probe_streams(input_video_path)
+    keyframes = get_keyframe_times(input_video_path)
+    duracion_total = int(duracion)
     segments = []
 
     for start_time in range(0, duracion_total, duracion_segmento):
         end_time = min(start_time + duracion_segmento, duracion_total)
-        clip = video.subclip(start_time, end_time)
         output_filename = f"segmento_{start_time}_{end_time}.mp4"
-        output_path = f"/tmp/{output_filename}"  # Guardar temporalmente en el sistema de archivos local
+        output_path = f"/tmp/{output_filename}"
+
+        smart_cut(input_video_path, start_time, end_time, output_path, keyframes, video_stream, audio_stream)
 
-        # Guardar el clip temporalmente
-        clip.write_videofile(output_path, codec='libx264', audio_codec='aac')
+        # Subir a S3 en la subcarpeta 'segments'
+        s3_url = upload_to_s3(output_path, 'segments')
+        segments.append(s3_url)
+
+    return segments
+
+def cortar_video_fanout(input_video_path, duracion_segmento):
+    # Decodifica y redimensiona la fuente una sola vez para todos los segmentos
+    segments = []
+    output_paths = render_segments_fanout(input_video_path, duracion_segmento, "segmento")
 
+    for output_path in output_paths:
         # Subir a S3 en la subcarpeta 'segments'
         s3_url = upload_to_s3(output_path, 'segments')
         segments.append(s3_url)
 
     return segments
 
-def cortar_y_mezclar_video(input_video_path, duracion_segmento):
+def render_segments_fanout(input_video_path, duracion_segmento, prefix):
+    with VideoFileClip(input_video_path) as video:
+        duracion_total = int(video.duration)
+        ranges = [
+            (start_time, min(start_time + duracion_segmento, duracion_total))
+            for start_time in range(0, duracion_total, duracion_segmento)
+        ]
+        output_paths = [f"/tmp/{prefix}_{start_time}_{end_time}.mp4" for start_time, end_time in ranges]
+        FanoutEncoder(video.resize((720, 1080)), ranges, output_paths).run()
+
+    return output_paths
+
+def cortar_y_mezclar_video(input_video_path, duracion_segmento, mode="reencode"):
+    if mode == "fanout":
+        return cortar_y_mezclar_video_fanout(input_video_path, duracion_segmento)
+    if mode == "copy":
+        return cortar_y_mezclar_video_copy(input_video_path, duracion_segmento)
+
     video = VideoFileClip(input_video_path).resize((720, 1080))
     duracion_total = int(video.duration)
     clips = []
@@ -45,34 +132,68 @@ def cortar_y_mezclar_video(input_video_path, duracion_segmento):
 
     random.shuffle(clips)
     video_final = concatenate_videoclips(clips)
-    output_filename = "video_mezclado.mp4"
-    output_path = f"/tmp/{output_filename}"
-    video_final.write_videofile(output_path, codec='libx264', audio_codec='aac')
 
     # Subir a S3 en la subcarpeta 'randomized'
-    return upload_to_s3(output_path, 'randomized')
+    return encode_to_s3("video_mezclado.mp4", 'randomized', lambda output_path, streamable: write_videofile(
+        video_final, output_path, streamable, codec='libx264', audio_codec='aac'))
+
+def cortar_y_mezclar_video_fanout(input_video_path, duracion_segmento):
+    # Todas las piezas salen del mismo encoder con los mismos parámetros,
+    # así que se pueden unir en orden aleatorio sin re-codificar
+    piezas = render_segments_fanout(input_video_path, duracion_segmento, "pieza")
+    random.shuffle(piezas)
+
+    try:
+        # Subir a S3 en la subcarpeta 'randomized'
+        return encode_to_s3("video_mezclado.mp4", 'randomized', lambda output_path, streamable: concat_files(
+            piezas, output_path), expected_size=sum(os.path.getsize(pieza) for pieza in piezas))
+    finally:
+        for pieza in piezas:
+            os.remove(pieza)
+
+def cortar_y_mezclar_video_copy(input_video_path, duracion_segmento):
+    # Piezas alineadas a keyframes con copia de streams y unión con el demuxer concat:
+    # no se decodifica nada y no se mantiene ningún clip en memoria.
+    # Las piezas conservan la resolución original y sus cortes caen en keyframes.
+    duracion, _, _ = probe_streams(input_video_path)
+    segment_times = list(range(duracion_segmento, int(duracion), duracion_segmento))
+    piezas = segment_copy(input_video_path, segment_times, "/tmp/pieza_copia")
+    random.shuffle(piezas)
+
+    try:
+        # Subir a S3 en la subcarpeta 'randomized'
+        return encode_to_s3("video_mezclado.mp4", 'randomized', lambda output_path, streamable: concat_files(
+            piezas, output_path), expected_size=sum(os.path.getsize(pieza) for pieza in piezas))
+    finally:
+        for pieza in piezas:
+            os.remove(pieza)
 
 def agregar_inicio_final(input_video_paths, inicio_path=None, final_path=None):
     videos_procesados = []
+    encode_args = normalized_encode_args()
 
-    inicio_clip = VideoFileClip(inicio_path).resize((720, 1080)) if inicio_path else None
-    final_clip = VideoFileClip(final_path).resize((720, 1080)) if final_path else None
+    # El inicio y el final se normalizan una sola vez y quedan en caché entre lotes
+    bumper_cache = BumperCache(encode_args)
+    inicio_normalizado = bumper_cache.get(inicio_path) if inicio_path else None
+    final_normalizado = bumper_cache.get(final_path) if final_path else None
 
     for input_video_path in input_video_paths:
-        video = VideoFileClip(input_video_path).resize((720, 1080))
-        clips = [video]
-        if inicio_clip:
-            clips.insert(0, inicio_clip)
-        if final_clip:
-            clips.append(final_clip)
-        combined_clip = concatenate_videoclips(clips)
-
         output_filename = f"procesado_{os.path.basename(input_video_path)}"
-        output_path = f"/tmp/{output_filename}"
-        combined_clip.write_videofile(output_path, codec='libx264', audio_codec='aac')
-
-        # Subir a S3 en la subcarpeta 'processed'
-        s3_url = upload_to_s3(output_path, 'processed')
+        body_path = f"/tmp/cuerpo_{os.path.basename(input_video_path)}"
+
+        # Solo se codifica el cuerpo; las piezas se unen con copia de streams
+        normalize_video(input_video_path, body_path, encode_args)
+        piezas = [body_path]
+        if inicio_normalizado:
+            piezas.insert(0, inicio_normalizado)
+        if final_normalizado:
+            piezas.append(final_normalizado)
+        try:
+            # Subir a S3 en la subcarpeta 'processed'
+            s3_url = encode_to_s3(output_filename, 'processed', lambda output_path, streamable: concat_files(
+                piezas, output_path), expected_size=sum(os.path.getsize(pieza) for pieza in piezas))
+        finally:
+            os.remove(body_path)
         videos_procesados.append(s3_url)
 
     return videos_procesados
@@ -81,12 +202,8 @@ def add_logo_and_background_audio(video_path, logo_path, audio_path, logo_positi
     # Cargar el video
     video = VideoFileClip(video_path).resize((720, 1080))
     
-    # Cargar el logo
-    logo = (ImageClip(logo_path)
-            .set_duration(video.duration)
-            .resize(height=50)  # Cambiar el tamaño del logo
-            .set_position(logo_position)  # Posición del logo
-            .set_opacity(0.5))  # Opacidad del logo
+    # Preparar el logo una sola vez: tamaño, posición y opacidad
+    logo = LogoOverlay(logo_path, video.size, height=50, opacity=0.5, position=logo_position)
 
     # Cargar el audio de fondo
     background_audio = AudioFileClip(audio_path)
@@ -95,16 +212,12 @@ def add_logo_and_background_audio(video_path, logo_path, audio_path, logo_positi
     if background_audio.duration < video.duration:
         background_audio = audio_loop(background_audio, duration=video.duration)
 
-    # Crear el video con el logo superpuesto
-    final_video = CompositeVideoClip([video, logo])
+    # Mezclar el logo solo en su región de cada frame
+    final_video = video.fl_image(logo)
     
     # Agregar el audio de fondo
     final_video = final_video.set_audio(background_audio)
 
-    # Exportar el video final
-    output_filename = f"final_video.mp4"
-    output_path = f"/tmp/{output_filename}"
-    final_video.write_videofile(output_path, codec='libx264', audio_codec='aac')
-
-    # Subir a S3 en la subcarpeta 'processed'
-    return upload_to_s3(output_path, 'processed')
+    # Exportar el video final y subirlo a S3 en la subcarpeta 'processed'
+    return encode_to_s3("final_video.mp4", 'processed', lambda output_path, streamable: write_videofile(
+        final_video, output_path, streamable, codec='libx264', audio_codec='aac'))
@@ -1,5 +1,4 @@
 import os
-import time
 import json
 import datetime
 import uuid
@@ -7,10 +6,14 @@ import boto3
 import cv2
 from moviepy.editor import VideoFileClip
 from pysrt import open as open_srt
+from modules.transcription_poller import TranscriptionPoller
+from modules.s3_listing import S3Listing
+from modules.subtitle_timeline import SubtitleTimeline
 
 # AWS clients
 transcribe = boto3.client('transcribe', region_name='us-east-2')
 s3 = boto3.client('s3')
+transcription_poller = None  # Se crea con la primera espera; importar el módulo no arranca nada
 
 # Configuration
 BUCKET_NAME = 'facebook-videos-bucket'
@@ -67,15 +70,10 @@ def start_transcription_job(media_file_uri):
 
 
 def wait_for_job_completion(transcription_job_name):
-    while True:
-        response = transcribe.get_transcription_job(TranscriptionJobName=transcription_job_name)
-        status = response['TranscriptionJob']['TranscriptionJobStatus']
-        if status in ['COMPLETED', 'FAILED']:
-            if status == 'COMPLETED':
-                return response['TranscriptionJob']['Transcript']['TranscriptFileUri']
-            else:
-                raise Exception(f"Transcription job {transcription_job_name} failed.")
-        time.sleep(10)
+    global transcription_poller
+    if transcription_poller is None:
+        transcription_poller = TranscriptionPoller(transcribe)
+    return transcription_poller.wait(transcription_job_name)
 
 def download_transcription(transcript_uri):
     transcript_file_name = os.path.join(LOCAL_FOLDER, 'transcription.json')
@@ -109,12 +107,15 @@ def get_text_size(text, font, font_scale, thickness):
     size = cv2.getTextSize(text, font, font_scale, thickness)[0]
     return size
 
-def draw_background(frame, line1, line2, font, font_scale, thickness, elapsed_ratio, text_positions):
+def draw_background(frame, line1, line2, font, font_scale, thickness, word_index, text_positions):
     words_line1 = line1.split()
     words_line2 = line2.split()
 
+    # Las palabras que no caben en dos líneas no se dibujan: se resalta la última visible
     total_words = len(words_line1) + len(words_line2)
-    word_index = int(elapsed_ratio * total_words)
+    if total_words == 0:
+        return
+    word_index = min(word_index, total_words - 1)
 
     if word_index < len(words_line1):
         word = words_line1[word_index]
@@ -156,6 +157,7 @@ def process_video(fragment_filename, audio_filename, music_filename, srt_filenam
 
     video_clip = VideoFileClip(local_fragment_path)
     subtitles = open_srt(srt_filename)
+    timeline = SubtitleTimeline(subtitles, video_clip.fps, video_clip.duration)
 
     def add_subtitles(get_frame, t):
         frame = get_frame(t)
@@ -165,35 +167,34 @@ def process_video(fragment_filename, audio_filename, music_filename, srt_filenam
         margin = int(frame_width * 0.1)
         safe_width = frame_width - 2 * margin
 
-        for subtitle in subtitles:
-            if subtitle.start.ordinal <= t*1000 < subtitle.end.ordinal:
-                font = cv2.FONT_HERSHEY_SIMPLEX
-                font_scale = 1.6
-                thickness = 3
-
-                line1, line2 = split_text(subtitle.text, safe_width, font, font_scale, thickness)
-
-                text_size_line1 = get_text_size(line1, font, font_scale, thickness)
-                text_size_line2 = get_text_size(line2, font, font_scale, thickness)
-                text_x_line1 = (frame_width - text_size_line1[0]) // 2
-                text_x_line2 = (frame_width - text_size_line2[0]) // 2
-                text_y_line1 = (frame_height + text_size_line1[1]) // 2 - 30
-                text_y_line2 = (frame_height + text_size_line1[1]) // 2 + 20
-
-                text_positions = [(text_x_line1, text_y_line1), (text_x_line2, text_y_line2)]
-                draw_background(frame_cv2, line1, line2, font, font_scale, thickness, t / video_clip.duration, text_positions)
-                
-                x = text_x_line1
-                for word in line1.split():
-                    cv2.putText(frame_cv2, word, (x, text_y_line1), font, font_scale, (255, 255, 255), thickness, cv2.LINE_AA)
-                    x += get_text_size(word, font, font_scale, thickness)[0] + 20
-
-                x = text_x_line2
-                for word in line2.split():
-                    cv2.putText(frame_cv2, word, (x, text_y_line2), font, font_scale, (255, 255, 255), thickness, cv2.LINE_AA)
-                    x += get_text_size(word, font, font_scale, thickness)[0] + 20
-                
-                break
+        active = timeline.lookup(t)
+        if active is not None:
+            text, word_index = active
+            font = cv2.FONT_HERSHEY_SIMPLEX
+            font_scale = 1.6
+            thickness = 3
+
+            line1, line2 = split_text(text, safe_width, font, font_scale, thickness)
+
+            text_size_line1 = get_text_size(line1, font, font_scale, thickness)
+            text_size_line2 = get_text_size(line2, font, font_scale, thickness)
+            text_x_line1 = (frame_width - text_size_line1[0]) // 2
+            text_x_line2 = (frame_width - text_size_line2[0]) // 2
+            text_y_line1 = (frame_height + text_size_line1[1]) // 2 - 30
+            text_y_line2 = (frame_height + text_size_line1[1]) // 2 + 20
+
+            text_positions = [(text_x_line1, text_y_line1), (text_x_line2, text_y_line2)]
+            draw_background(frame_cv2, line1, line2, font, font_scale, thickness, word_index, text_positions)
+            
+            x = text_x_line1
+            for word in line1.split():
+                cv2.putText(frame_cv2, word, (x, text_y_line1), font, font_scale, (255, 255, 255), thickness, cv2.LINE_AA)
+                x += get_text_size(word, font, font_scale, thickness)[0] + 20
+
+            x = text_x_line2
+            for word in line2.split():
+                cv2.putText(frame_cv2, word, (x, text_y_line2), font, font_scale, (255, 255, 255), thickness, cv2.LINE_AA)
+                x += get_text_size(word, font, font_scale, thickness)[0] + 20
 
         return cv2.cvtColor(frame_cv2, cv2.COLOR_BGR2RGB)
 
@@ -205,13 +206,10 @@ def process_video(fragment_filename, audio_filename, music_filename, srt_filenam
     os.remove(output_path)
 
 def main():
-    s3_video_objects = s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=VIDEO_FOLDER).get('Contents', [])
-    s3_audio_objects = s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=AUDIO_FOLDER).get('Contents', [])
-    s3_music_objects = s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=BACKGROUND_MUSIC_FOLDER).get('Contents', [])
-
-    video_files = [obj['Key'] for obj in s3_video_objects if obj['Key'].endswith('.mp4')]
-    audio_files = [obj['Key'] for obj in s3_audio_objects if obj['Key'].endswith('.mp3') or obj['Key'].endswith('.wav')]
-    music_files = [obj['Key'] for obj in s3_music_objects if obj['Key'].endswith('.mp3') or obj['Key'].endswith('.wav')]
+    listing = S3Listing(BUCKET_NAME, s3)
+    video_files = listing.keys(VIDEO_FOLDER, suffixes=('.mp4',))
+    audio_files = listing.keys(AUDIO_FOLDER, suffixes=('.mp3', '.wav'))
+    music_files = listing.keys(BACKGROUND_MUSIC_FOLDER, suffixes=('.mp3', '.wav'))
 
     if not video_files or not audio_files or not music_files:
         print("No se encontraron archivos de video, audio o música de fondo.")
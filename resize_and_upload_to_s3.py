@@ -1,17 +1,18 @@
 import os
-import boto3
 from moviepy.editor import VideoFileClip
 from config import Config
 from moviepy.video.fx.all import resize
+from modules.media_probe import MediaProbe
+from modules.s3_transfer import s3, download_file, upload_file
+from modules.s3_listing import S3Listing
 
-s3 = boto3.client('s3')
 LOG_FILE = 'resized_videos.log'
 
 def download_from_s3(s3_key, local_path):
-    s3.download_file(Config.S3_BUCKET_NAME, s3_key, local_path)
+    download_file(Config.S3_BUCKET_NAME, s3_key, local_path)
 
 def upload_to_s3(local_path, s3_key):
-    s3.upload_file(local_path, Config.S3_BUCKET_NAME, s3_key)
+    upload_file(local_path, Config.S3_BUCKET_NAME, s3_key)
 
 def resize_video(input_path, output_path):
     try:
@@ -48,8 +49,8 @@ def get_resized_videos():
 
 def process_and_upload_videos_from_s3(s3_input_folder='segments', s3_output_folder='resized', local_folder='/tmp'):
     resized_videos = get_resized_videos()
-    s3_objects = s3.list_objects_v2(Bucket=Config.S3_BUCKET_NAME, Prefix=s3_input_folder).get('Contents', [])
-    video_files = [obj['Key'] for obj in s3_objects if obj['Key'].endswith('.mp4')]
+    media_probe = MediaProbe(s3_client=s3)
+    video_files = S3Listing(Config.S3_BUCKET_NAME, s3).keys(s3_input_folder, suffixes=('.mp4',))
     
     for s3_key in video_files:
         video_filename = os.path.basename(s3_key)
@@ -59,6 +60,16 @@ def process_and_upload_videos_from_s3(s3_input_folder='segments', s3_output_fold
             print(f"El video {video_filename} ya ha sido redimensionado anteriormente. Saltando...")
             continue
         
+        # Descartar videos demasiado angostos sin descargarlos (solo se lee la cabecera)
+        try:
+            width = media_probe.probe_s3(Config.S3_BUCKET_NAME, s3_key)['width']
+        except Exception as e:
+            print(f"Error al leer los metadatos del video {video_filename}: {e}")
+            width = None
+        if width is not None and width < 540:
+            print(f"Error: El ancho del video original ({width}px) es menor que el mínimo requerido (540px).")
+            continue
+
         local_input_path = os.path.join(local_folder, video_filename)
         local_output_path = os.path.join(local_folder, video_filename)
         resized_s3_key = f"{s3_output_folder}/{video_filename}"
@@ -0,0 +1,125 @@
+import json
+import uuid
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+class FakeGraphServer:
+    """
+    Sustituto local de los endpoints de subida de Reels de la Graph API para probar
+    FacebookReelsUploader sin red: inicio (upload_phase=start), subida por offsets,
+    consulta de estado (bytes_transferred) y publicación (upload_phase=finish).
+    Con probabilidad drop_rate un trozo se corta a mitad: el servidor se queda con
+    los bytes recibidos hasta ese punto y cierra la conexión sin responder, como
+    un corte de red real. status_error simula fallos de la consulta de estado: un
+    código HTTP con el que responder o 'drop' para cortar la conexión.
+    """
+
+    def __init__(self, drop_rate=0.0):
+        self.drop_rate = drop_rate
+        self.status_error = None
+        self.lock = threading.Lock()
+        self.uploads = {}  # video_id -> {'file_size', 'data' (bytearray), 'published'}
+        self.bytes_received = 0
+        self.drops = 0
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), FakeGraphHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+class FakeGraphHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        fake = self.server.fake
+        video_id = urlparse(self.path).path.strip('/')
+        if fake.status_error == 'drop':
+            self.close_connection = True
+            self.connection.shutdown(2)
+            return
+        if fake.status_error is not None:
+            return self.reply(fake.status_error, {'error': {'message': 'Status unavailable'}})
+        with fake.lock:
+            upload = fake.uploads.get(video_id)
+            if upload is None:
+                return self.reply(404, {'error': {'message': f"Unknown video {video_id}"}})
+            uploading = 'complete' if len(upload['data']) == upload['file_size'] else 'in_progress'
+            return self.reply(200, {'id': video_id, 'status': {
+                'uploading_phase': {'status': uploading, 'bytes_transferred': len(upload['data'])}}})
+
+    def do_POST(self):
+        fake = self.server.fake
+        url = urlparse(self.path)
+        if url.path.startswith('/rupload/'):
+            return self.receive_chunk(url.path[len('/rupload/'):])
+
+        params = parse_qs(url.query)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+        params.update(parse_qs(body))
+        phase = params.get('upload_phase', [''])[0]
+        if phase == 'start':
+            video_id = uuid.uuid4().hex[:12]
+            with fake.lock:
+                fake.uploads[video_id] = {'file_size': None, 'data': bytearray(), 'published': False}
+            return self.reply(200, {'video_id': video_id, 'upload_url': f"{fake.url}/rupload/{video_id}"})
+        if phase == 'finish':
+            video_id = params.get('video_id', [''])[0]
+            with fake.lock:
+                upload = fake.uploads.get(video_id)
+                if upload is None or upload['file_size'] is None or len(upload['data']) != upload['file_size']:
+                    return self.reply(400, {'error': {'message': 'Upload incomplete'}})
+                upload['published'] = True
+            return self.reply(200, {'success': True})
+        return self.reply(400, {'error': {'message': f"Unknown upload_phase {phase}"}})
+
+    def receive_chunk(self, video_id):
+        fake = self.server.fake
+        offset = int(self.headers.get('offset', 0))
+        file_size = int(self.headers.get('file_size', 0))
+        length = int(self.headers.get('Content-Length', 0))
+        with fake.lock:
+            upload = fake.uploads.get(video_id)
+            if upload is None:
+                self.rfile.read(length)
+                return self.reply(404, {'error': {'message': f"Unknown video {video_id}"}})
+            upload['file_size'] = file_size
+            if offset != len(upload['data']):
+                self.rfile.read(length)
+                return self.reply(400, {'debug_info': {'type': 'OffsetInvalidError',
+                                                       'message': f"Expected offset {len(upload['data'])}"}})
+
+        if random.random() < fake.drop_rate and length > 1:
+            # Corte a mitad del trozo: se conserva lo recibido y no se responde
+            received = self.rfile.read(random.randint(1, length - 1))
+            with fake.lock:
+                upload['data'] += received
+                fake.bytes_received += len(received)
+                fake.drops += 1
+            self.close_connection = True
+            self.connection.shutdown(2)
+            return
+
+        data = self.rfile.read(length)
+        with fake.lock:
+            upload['data'] += data
+            fake.bytes_received += len(data)
+        return self.reply(200, {'success': True})
+
+    def reply(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,85 @@
+import time
+import random
+import threading
+from botocore.exceptions import ClientError
+
+class FakeTranscribe:
+    """
+    Sustituto local del cliente de Amazon Transcribe para probar el poller sin AWS.
+    Cada trabajo termina tras una duración aleatoria entre min_duration y max_duration;
+    una fracción failure_rate termina en FAILED. Si llegan más de max_calls_per_second
+    consultas por segundo responde con ThrottlingException, como la API real.
+    network_error, si se indica, es la excepción que lanzan todas las consultas.
+    max_active guarda el máximo de consultas simultáneas observado.
+    """
+
+    def __init__(self, min_duration=5, max_duration=20, failure_rate=0.0,
+                 max_calls_per_second=50, call_latency=0.02):
+        self.min_duration = min_duration
+        self.max_duration = max_duration
+        self.failure_rate = failure_rate
+        self.max_calls_per_second = max_calls_per_second
+        self.call_latency = call_latency
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.calls = 0
+        self.throttled = 0
+        self.window_start = time.monotonic()
+        self.window_calls = 0
+        self.network_error = None
+        self.active = 0
+        self.max_active = 0
+
+    def start_transcription_job(self, TranscriptionJobName, **kwargs):
+        with self.lock:
+            self.jobs[TranscriptionJobName] = {
+                'done_at': time.monotonic() + random.uniform(self.min_duration, self.max_duration),
+                'fails': random.random() < self.failure_rate,
+                'output_bucket': kwargs.get('OutputBucketName', 'fake-bucket'),
+            }
+        return {'TranscriptionJob': {'TranscriptionJobName': TranscriptionJobName,
+                                     'TranscriptionJobStatus': 'IN_PROGRESS'}}
+
+    def get_transcription_job(self, TranscriptionJobName):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.call_latency)
+            return self.job_status(TranscriptionJobName)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def job_status(self, TranscriptionJobName):
+        with self.lock:
+            self.calls += 1
+            if self.network_error is not None:
+                raise self.network_error
+            now = time.monotonic()
+            if now - self.window_start >= 1:
+                self.window_start, self.window_calls = now, 0
+            self.window_calls += 1
+            if self.window_calls > self.max_calls_per_second:
+                self.throttled += 1
+                raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}},
+                                  'GetTranscriptionJob')
+
+            job = self.jobs.get(TranscriptionJobName)
+            if job is None:
+                raise ClientError({'Error': {'Code': 'BadRequestException',
+                                             'Message': 'The requested job couldn\'t be found.'}},
+                                  'GetTranscriptionJob')
+            transcription_job = {'TranscriptionJobName': TranscriptionJobName}
+            if now < job['done_at']:
+                transcription_job['TranscriptionJobStatus'] = 'IN_PROGRESS'
+            elif job['fails']:
+                transcription_job['TranscriptionJobStatus'] = 'FAILED'
+                transcription_job['FailureReason'] = 'Simulated failure'
+            else:
+                transcription_job['TranscriptionJobStatus'] = 'COMPLETED'
+                transcription_job['Transcript'] = {
+                    'TranscriptFileUri': f"https://s3.amazonaws.com/{job['output_bucket']}/{TranscriptionJobName}.json"
+                }
+            return {'TranscriptionJob': transcription_job}
+
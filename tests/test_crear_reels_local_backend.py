@@ -0,0 +1,115 @@
+import os
+import sys
+import types
+import numpy as np
+import pytest
+from moviepy.editor import AudioFileClip, VideoFileClip
+from modules.ffmpeg_utils import run_ffmpeg
+from modules.transcript_cache import TranscriptCache
+
+# Los scripts de crear-reels se importan como módulos sueltos desde su carpeta
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'crear-reels'))
+import transcription_backends
+import video_processing
+
+SAMPLE_RATE = transcription_backends.LocalWhisperBackend.SAMPLE_RATE
+# Palabras que "reconoce" el modelo falso en cada audio, relativas a su inicio
+SPOKEN_WORDS = [(0.2, 0.6, ' hola'), (0.8, 1.2, ' mundo')]
+
+class FakeWhisperModel:
+    """Sustituto de faster_whisper.WhisperModel: reconoce SPOKEN_WORDS al inicio de cada audio del lote."""
+
+    def __init__(self, model_size, **kwargs):
+        self.batches = []
+
+    def transcribe(self, audio, language=None, word_timestamps=False):
+        self.batches.append(len(audio) / SAMPLE_RATE)
+        words = []
+        # Los audios de un lote van separados por silencio: cada tramo no nulo es un audio
+        voiced = np.flatnonzero(np.diff(np.concatenate(([0], (audio != 0).astype(np.int8)))) == 1)
+        for audio_start in voiced / SAMPLE_RATE:
+            words += [types.SimpleNamespace(start=audio_start + start, end=audio_start + end, word=word)
+                      for start, end, word in SPOKEN_WORDS]
+        return [types.SimpleNamespace(words=words)], None
+
+def fake_decode_audio(path, sampling_rate):
+    with AudioFileClip(path) as clip:
+        return np.ones(int(clip.duration * sampling_rate), dtype=np.float32)
+
+class FakeLease:
+    def __init__(self, path):
+        self.path = path
+        self.released = False
+
+    def release(self):
+        self.released = True
+
+@pytest.fixture
+def local_backend(monkeypatch):
+    # faster-whisper no es una dependencia obligatoria: se sustituye el paquete entero
+    monkeypatch.setitem(sys.modules, 'faster_whisper', types.SimpleNamespace(
+        WhisperModel=FakeWhisperModel, decode_audio=fake_decode_audio))
+    monkeypatch.setattr(transcription_backends, '_backends', {})
+    backend = transcription_backends.get_transcription_backend('local')
+    backend.batch_wait = 0.01
+    return backend
+
+@pytest.fixture
+def assets(tmp_path):
+    paths = {name: str(tmp_path / name) for name in ('fuente.mp4', 'hook.mp4', 'voz.wav', 'musica.wav')}
+    run_ffmpeg(['-f', 'lavfi', '-i', 'testsrc=size=160x240:rate=24', '-t', '2', '-pix_fmt', 'yuv420p',
+                paths['fuente.mp4']])
+    run_ffmpeg(['-f', 'lavfi', '-i', 'testsrc=size=160x240:rate=24', '-f', 'lavfi', '-i', 'sine=frequency=220',
+                '-t', '2', '-pix_fmt', 'yuv420p', '-c:a', 'aac', paths['hook.mp4']])
+    run_ffmpeg(['-f', 'lavfi', '-i', 'sine=frequency=440', '-t', '2', paths['voz.wav']])
+    run_ffmpeg(['-f', 'lavfi', '-i', 'sine=frequency=330', '-t', '4', paths['musica.wav']])
+    return paths
+
+@pytest.fixture
+def stub_s3(monkeypatch, tmp_path, assets):
+    """Sustituye todo acceso a S3 de video_processing por archivos locales."""
+    leases = []
+    uploads = {}
+
+    def acquire_asset(s3_key, etag=None):
+        leases.append(FakeLease(assets[os.path.basename(s3_key)]))
+        return leases[-1]
+
+    monkeypatch.setattr(video_processing, 'acquire_asset', acquire_asset)
+    monkeypatch.setattr(video_processing, 'get_etag', lambda s3_key: '"etag-voz"')
+    monkeypatch.setattr(video_processing, 'upload_to_s3', lambda local_path, s3_key: uploads.update(
+        {s3_key: os.path.getsize(local_path)}))
+    monkeypatch.setattr(video_processing, 'transcript_cache', TranscriptCache(cache_dir=str(tmp_path / 'cache')))
+    monkeypatch.setattr(video_processing, 'LOCAL_FOLDER', str(tmp_path))
+    return leases, uploads
+
+def test_local_backend_splits_a_batch_per_audio(local_backend, assets):
+    results = local_backend.transcribe_batch([(assets['voz.wav'], None), (assets['musica.wav'], None)])
+
+    # Cada audio recibe sus palabras con tiempos re-basados a su propio inicio
+    assert len(results) == 2
+    for words in results:
+        assert [word['content'] for word in words] == ['hola', 'mundo']
+        assert [t for word in words for t in (word['start'], word['end'])] == pytest.approx([0.2, 0.6, 0.8, 1.2])
+    # Los dos audios se transcriben en una sola llamada al modelo
+    assert len(local_backend.model.batches) == 1
+
+def test_fragment_pipeline_with_local_backend(local_backend, assets, stub_s3):
+    leases, uploads = stub_s3
+
+    transcript = video_processing.transcribe_fragment('fuente.mp4', 0, 1, ['voices/voz.wav'], 'bucket',
+                                                      transcription_backend='local')
+    assert [word['content'] for word in transcript['words']] == ['hola', 'mundo']
+
+    with VideoFileClip(assets['fuente.mp4'], audio=False) as video_clip:
+        fragment_path = video_processing.render_fragment(video_clip, 'fuente.mp4', 0, 1, assets['musica.wav'],
+                                                         ['hooks/hook.mp4'], transcript)
+    with VideoFileClip(fragment_path) as reel:
+        assert abs(reel.duration - 4) < 0.2  # Hook + fragmento
+        assert reel.audio is not None
+
+    assert video_processing.upload_fragment(fragment_path) == ('reel_1_fuente.mp4', 'reels/reel_1_fuente.mp4')
+    assert uploads['reels/reel_1_fuente.mp4'] > 0
+    assert not os.path.exists(fragment_path)
+    # La voz y el hook vuelven a la caché de assets
+    assert leases and all(lease.released for lease in leases)
@@ -0,0 +1,77 @@
+import os
+import pytest
+from modules.facebook_reel_uploader import FacebookReelsUploader
+from fake_graph import FakeGraphServer
+
+CHUNK_SIZE = 256 * 1024
+
+@pytest.fixture
+def fake():
+    server = FakeGraphServer()
+    yield server
+    server.close()
+
+def make_uploader(fake, tmp_path, max_retries=20):
+    uploader = FacebookReelsUploader('page', 'token', log_file=str(tmp_path / 'uploaded.log'),
+                                     graph_url=fake.url, chunk_size=CHUNK_SIZE, max_retries=max_retries,
+                                     state_dir=str(tmp_path / 'state'))
+    uploader.retry_wait = 0  # Sin esperas entre reintentos: los cortes son simulados
+    return uploader
+
+def make_video(tmp_path, size):
+    video_path = tmp_path / 'reel_prueba.mp4'
+    content = os.urandom(size)
+    video_path.write_bytes(content)
+    return str(video_path), content
+
+def test_upload_survives_dropped_chunks(fake, tmp_path):
+    fake.drop_rate = 0.3
+    video_path, content = make_video(tmp_path, 4 * 1024 * 1024)
+
+    assert make_uploader(fake, tmp_path).upload_reel(video_path, 'reel_prueba.mp4', 'Título', 'Descripción')
+
+    upload = next(iter(fake.uploads.values()))
+    assert bytes(upload['data']) == content
+    assert upload['published']
+    assert fake.drops > 0
+    # Tras un corte solo se reenvía lo que el servidor no tiene
+    assert len(content) <= fake.bytes_received <= len(content) * 1.05
+
+def test_resume_keeps_state_when_status_query_fails(fake, tmp_path):
+    video_path, content = make_video(tmp_path, 1024 * 1024)
+    uploader = make_uploader(fake, tmp_path, max_retries=2)
+
+    # Una subida anterior dejó la mitad del archivo en el servidor
+    video_id, upload_url = uploader.start_upload()
+    fake.uploads[video_id]['data'] += content[:len(content) // 2]
+    uploader.save_upload_state('reel_prueba.mp4', {'video_id': video_id, 'upload_url': upload_url,
+                                                   'file_size': len(content), 'offset': 0})
+
+    # Un fallo de red o un 5xx no descarta la sesión
+    for status_error in ('drop', 500):
+        fake.status_error = status_error
+        assert not uploader.upload_reel(video_path, 'reel_prueba.mp4', 'Título', 'Descripción')
+        assert os.path.exists(uploader.upload_state_path('reel_prueba.mp4'))
+        assert len(fake.uploads) == 1
+
+    # Con el servidor de vuelta se reanuda la misma sesión desde la mitad
+    fake.status_error = None
+    received_before = fake.bytes_received
+    assert uploader.upload_reel(video_path, 'reel_prueba.mp4', 'Título', 'Descripción')
+    assert len(fake.uploads) == 1
+    assert bytes(fake.uploads[video_id]['data']) == content
+    assert fake.uploads[video_id]['published']
+    assert fake.bytes_received - received_before == len(content) - len(content) // 2
+    assert not os.path.exists(uploader.upload_state_path('reel_prueba.mp4'))
+
+def test_unknown_session_starts_a_new_upload(fake, tmp_path):
+    video_path, content = make_video(tmp_path, 512 * 1024)
+    uploader = make_uploader(fake, tmp_path)
+    uploader.save_upload_state('reel_prueba.mp4', {'video_id': 'caducado', 'upload_url': f"{fake.url}/rupload/caducado",
+                                                   'file_size': len(content), 'offset': 0})
+
+    assert uploader.upload_reel(video_path, 'reel_prueba.mp4', 'Título', 'Descripción')
+
+    upload = next(iter(fake.uploads.values()))
+    assert bytes(upload['data']) == content
+    assert upload['published']
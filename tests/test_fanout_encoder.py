@@ -0,0 +1,45 @@
+import pytest
+from moviepy.editor import VideoFileClip
+from modules import fanout_encoder
+from modules.fanout_encoder import FanoutEncoder
+from modules.ffmpeg_utils import run_ffmpeg
+
+RANGES = [(0, 2), (2, 4), (4, 6)]
+
+@pytest.fixture(scope='module')
+def source(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('fanout') / 'fuente.mp4')
+    run_ffmpeg([
+        '-f', 'lavfi', '-i', 'testsrc=size=160x120:rate=24', '-f', 'lavfi', '-i', 'sine=frequency=440',
+        '-t', '6', '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest', path
+    ])
+    return path
+
+def output_paths(tmp_path):
+    return [str(tmp_path / f"pieza_{start}_{end}.mp4") for start, end in RANGES]
+
+def test_every_range_gets_video_and_audio(source, tmp_path):
+    paths = output_paths(tmp_path)
+    with VideoFileClip(source) as clip:
+        FanoutEncoder(clip, RANGES, paths, preset='ultrafast', max_active_encoders=2).run()
+
+    for path in paths:
+        with VideoFileClip(path) as piece:
+            assert abs(piece.duration - 2) < 0.2
+            assert piece.audio is not None
+    # Los temporales de audio y video se borran tras unirlos
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(p.split('/')[-1] for p in paths)
+
+def test_encoder_slot_released_when_writer_fails(source, tmp_path, monkeypatch):
+    def failing_writer(*args, **kwargs):
+        raise OSError("ffmpeg no arrancó")
+    monkeypatch.setattr(fanout_encoder, 'FFMPEG_VideoWriter', failing_writer)
+
+    with VideoFileClip(source) as clip:
+        encoder = FanoutEncoder(clip, RANGES, output_paths(tmp_path), max_active_encoders=1)
+        with pytest.raises(OSError):
+            encoder.run()
+
+    # El único hueco vuelve a estar libre y no quedan audios extraídos a medias
+    assert encoder.active_encoders.acquire(blocking=False)
+    assert list(tmp_path.iterdir()) == []
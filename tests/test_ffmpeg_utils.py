@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from moviepy.editor import VideoFileClip
+from modules import ffmpeg_utils
+from modules.ffmpeg_utils import run_ffmpeg, smart_cut, decodes_cleanly, normalize_video, normalized_encode_args
+
+FPS = 30
+# Un keyframe cada 2 s y B-frames, como un video de cámara o de descarga típico
+KEYFRAMES = [0.0, 2.0, 4.0, 6.0, 8.0]
+VIDEO_STREAM = {'codec_name': 'h264', 'pix_fmt': 'yuv420p', 'profile': 'High', 'level': 13, 'time_base': '1/15360'}
+AUDIO_STREAM = {'codec_name': 'aac'}
+
+@pytest.fixture(scope='module')
+def source(tmp_path_factory):
+    # Codificado con otro preset que el tramo re-codificado, así sus SPS/PPS son distintos
+    path = str(tmp_path_factory.mktemp('smart_cut') / 'fuente.mp4')
+    run_ffmpeg([
+        '-f', 'lavfi', '-i', f"testsrc=size=320x240:rate={FPS}", '-f', 'lavfi', '-i', 'sine=frequency=440',
+        '-t', '10', '-c:v', 'libx264', '-preset', 'slow', '-profile:v', 'high', '-g', '60', '-keyint_min', '60',
+        '-sc_threshold', '0', '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest', path
+    ])
+    return path
+
+def frame_difference(cut_path, source_path, times, offset):
+    with VideoFileClip(cut_path) as cut, VideoFileClip(source_path) as original:
+        return max(np.abs(cut.get_frame(t).astype(int) - original.get_frame(t + offset).astype(int)).mean()
+                   for t in times)
+
+def test_smart_cut_splice_decodes(source, tmp_path):
+    output_path = str(tmp_path / 'corte.mp4')
+    # 1.0 no es keyframe: se re-codifica [1, 2) y se copia desde el keyframe de 2.0
+    smart_cut(source, 1.0, 7.0, output_path, KEYFRAMES, VIDEO_STREAM, AUDIO_STREAM)
+
+    assert decodes_cleanly(output_path)
+    with VideoFileClip(output_path) as cut:
+        assert abs(cut.duration - 6.0) < 0.2
+    # Antes y después de la unión la imagen es la del original en el mismo instante
+    assert frame_difference(output_path, source, [0.1, 0.9, 1.05, 1.5, 4.5], offset=1.0) < 3
+
+def test_smart_cut_falls_back_to_full_encode(source, tmp_path, monkeypatch):
+    output_path = str(tmp_path / 'corte.mp4')
+    monkeypatch.setattr(ffmpeg_utils, 'decodes_cleanly', lambda path, duration=None: False)
+
+    smart_cut(source, 1.0, 7.0, output_path, KEYFRAMES, VIDEO_STREAM, AUDIO_STREAM)
+
+    monkeypatch.undo()
+    assert decodes_cleanly(output_path)
+    assert frame_difference(output_path, source, [0.1, 1.5, 4.5], offset=1.0) < 3
+
+@pytest.mark.parametrize('with_audio', [True, False])
+def test_normalize_video_always_outputs_audio(tmp_path, with_audio):
+    # No usa ffprobe: debe funcionar solo con el ffmpeg de moviepy
+    input_path = str(tmp_path / 'entrada.mp4')
+    output_path = str(tmp_path / 'normalizado.mp4')
+    audio_input = ['-f', 'lavfi', '-i', 'sine=frequency=440'] if with_audio else []
+    run_ffmpeg(['-f', 'lavfi', '-i', f"testsrc=size=320x240:rate={FPS}"] + audio_input +
+               ['-t', '1', '-c:v', 'libx264', '-pix_fmt', 'yuv420p', input_path])
+
+    normalize_video(input_path, output_path, normalized_encode_args(width=160, height=240))
+
+    with VideoFileClip(output_path) as normalized:
+        assert normalized.size == [160, 240]
+        assert normalized.audio is not None
@@ -0,0 +1,53 @@
+import os
+import pytest
+from config import Config
+from modules import s3_transfer
+
+@pytest.fixture
+def uploads(monkeypatch):
+    uploaded = {}
+    def upload_file(local_path, bucket, key):
+        with open(local_path, 'rb') as f:
+            uploaded[key] = (os.path.dirname(os.path.dirname(local_path)), f.read())
+    monkeypatch.setattr(s3_transfer, 'upload_file', upload_file)
+    return uploaded
+
+def write_output(path):
+    with open(path, 'wb') as f:
+        f.write(b'video')
+
+def test_output_goes_to_memory_when_it_fits(monkeypatch, tmp_path, uploads):
+    monkeypatch.setattr(Config, 'ENCODE_IN_MEMORY', True)
+    monkeypatch.setattr(Config, 'MEMORY_OUTPUT_FOLDER', str(tmp_path))
+    monkeypatch.setattr(Config, 'MEMORY_OUTPUT_MIN_FREE', 1)
+
+    assert s3_transfer.upload_output('bucket', 'reels/reel.mp4', write_output) == 's3://bucket/reels/reel.mp4'
+
+    assert uploads['reels/reel.mp4'] == (str(tmp_path), b'video')
+    # El temporal se borra después de subirlo
+    assert list(tmp_path.iterdir()) == []
+
+def test_output_falls_back_to_disk_without_free_memory(monkeypatch, tmp_path, uploads):
+    monkeypatch.setattr(Config, 'ENCODE_IN_MEMORY', True)
+    monkeypatch.setattr(Config, 'MEMORY_OUTPUT_FOLDER', str(tmp_path))
+    monkeypatch.setattr(Config, 'MEMORY_OUTPUT_MIN_FREE', 1)
+    free = s3_transfer.shutil.disk_usage(str(tmp_path)).free
+
+    assert s3_transfer.output_folder() == str(tmp_path)
+    assert s3_transfer.output_folder(expected_size=free * 2) == s3_transfer.DISK_OUTPUT_FOLDER
+    monkeypatch.setattr(Config, 'MEMORY_OUTPUT_FOLDER', str(tmp_path / 'no_existe'))
+    assert s3_transfer.output_folder() == s3_transfer.DISK_OUTPUT_FOLDER
+
+def test_output_is_cleaned_up_when_produce_fails(monkeypatch, tmp_path, uploads):
+    monkeypatch.setattr(Config, 'ENCODE_IN_MEMORY', True)
+    monkeypatch.setattr(Config, 'MEMORY_OUTPUT_FOLDER', str(tmp_path))
+    monkeypatch.setattr(Config, 'MEMORY_OUTPUT_MIN_FREE', 1)
+
+    def failing_produce(path):
+        write_output(path)
+        raise IOError("ffmpeg falló")
+
+    with pytest.raises(IOError):
+        s3_transfer.upload_output('bucket', 'reels/reel.mp4', failing_produce)
+    assert uploads == {}
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,21 @@
+from pysrt import SubRipFile, SubRipItem, SubRipTime
+from modules.subtitle_timeline import SubtitleTimeline
+
+def cue(index, start_ms, end_ms, text):
+    return SubRipItem(index, SubRipTime.from_ordinal(start_ms), SubRipTime.from_ordinal(end_ms), text)
+
+def test_one_word_cues_follow_their_own_timing():
+    subtitles = SubRipFile([cue(1, 0, 500, 'hola'), cue(2, 500, 1200, 'mundo')])
+    timeline = SubtitleTimeline(subtitles, fps=10, duration=2)
+
+    assert timeline.lookup(0.0) == ('hola', 0)
+    assert timeline.lookup(0.4) == ('hola', 0)
+    assert timeline.lookup(0.5) == ('mundo', 0)
+    assert timeline.lookup(1.1) == ('mundo', 0)
+    assert timeline.lookup(1.2) is None
+    assert timeline.lookup(5.0) is None
+
+def test_multi_word_cue_splits_its_time_evenly():
+    timeline = SubtitleTimeline(SubRipFile([cue(1, 0, 1000, 'uno dos tres cuatro')]), fps=10, duration=1)
+
+    assert [timeline.lookup(t / 10)[1] for t in range(10)] == [0, 0, 0, 1, 1, 2, 2, 2, 3, 3]
@@ -0,0 +1,75 @@
+import pytest
+from botocore.exceptions import EndpointConnectionError
+from modules.transcription_poller import TranscriptionPoller
+from fake_transcribe import FakeTranscribe
+
+def make_poller(fake, **kwargs):
+    options = dict(max_concurrent_polls=4, min_interval=0.01, max_interval=0.05, max_network_errors=3)
+    options.update(kwargs)
+    return TranscriptionPoller(fake, **options)
+
+def start_jobs(fake, poller, count):
+    futures = []
+    for index in range(count):
+        job_name = f"prueba_{index}"
+        fake.start_transcription_job(TranscriptionJobName=job_name)
+        futures.append(poller.submit(job_name))
+    return futures
+
+@pytest.fixture
+def poller_factory():
+    pollers = []
+    def factory(fake, **kwargs):
+        pollers.append(make_poller(fake, **kwargs))
+        return pollers[-1]
+    yield factory
+    for poller in pollers:
+        poller.close()
+
+def test_concurrent_polls_stay_under_the_cap(poller_factory):
+    fake = FakeTranscribe(min_duration=0.1, max_duration=0.3, max_calls_per_second=10000, call_latency=0.02)
+    poller = poller_factory(fake, max_concurrent_polls=3)
+
+    futures = start_jobs(fake, poller, 30)
+
+    assert all(future.result(timeout=10).endswith('.json') for future in futures)
+    assert fake.max_active == 3
+    assert poller.stats['completed'] == 30
+
+def test_throttling_slows_down_polling(poller_factory):
+    fake = FakeTranscribe(min_duration=0.5, max_duration=1.0, max_calls_per_second=20, call_latency=0.001)
+    poller = poller_factory(fake, max_concurrent_polls=8)
+
+    futures = start_jobs(fake, poller, 40)
+
+    # Aunque la API responda con throttling, ningún trabajo se da por fallido
+    assert all(future.result(timeout=20).endswith('.json') for future in futures)
+    assert fake.throttled > 0
+    assert poller.stats['throttled'] == fake.throttled
+    # Después del throttling las consultas quedan limitadas a un ritmo por segundo
+    assert poller.call_rate is not None
+
+def test_network_errors_fail_the_job_after_the_cap(poller_factory):
+    fake = FakeTranscribe(min_duration=10, max_duration=10, call_latency=0)
+    fake.network_error = EndpointConnectionError(endpoint_url='https://transcribe.fake')
+    poller = poller_factory(fake, max_network_errors=3)
+
+    future, = start_jobs(fake, poller, 1)
+
+    with pytest.raises(EndpointConnectionError):
+        future.result(timeout=10)
+    assert fake.calls == 3
+    assert poller.stats['failed'] == 1
+
+def test_close_fails_pending_jobs():
+    fake = FakeTranscribe(min_duration=60, max_duration=60, call_latency=0)
+    poller = make_poller(fake)
+    futures = start_jobs(fake, poller, 3)
+
+    poller.close()
+
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(timeout=1)
+    with pytest.raises(RuntimeError):
+        poller.submit('otro')
@@ -12,8 +12,9 @@ def randomize():
 
         file = request.files['video']
         duration = int(request.form['duration'])
+        mode = request.form.get('mode', 'reencode')
 
-        if file.filename == '' or duration <= 0:
+        if file.filename == '' or duration <= 0 or mode not in ('reencode', 'copy', 'fanout'):
             return redirect(request.url)
 
         # Guardar temporalmente el archivo subido
@@ -21,7 +22,7 @@ def randomize():
         file.save(filepath)
 
         # Cortar y mezclar el video, luego subirlo a S3
-        mixed_video_filename = cortar_y_mezclar_video(filepath, duration)
+        mixed_video_filename = cortar_y_mezclar_video(filepath, duration, mode=mode)
         
         return render_template('randomize.html', video=mixed_video_filename)
 
@@ -12,8 +12,9 @@ def segment():
 
         file = request.files['video']
         duration = int(request.form['duration'])
+        mode = request.form.get('mode', 'reencode')
 
-        if file.filename == '' or duration <= 0:
+        if file.filename == '' or duration <= 0 or mode not in ('reencode', 'copy', 'fanout'):
             return redirect(request.url)
 
         # Guardar temporalmente el archivo subido
@@ -21,7 +22,7 @@ def segment():
         file.save(filepath)
 
         # Cortar el video y subir los segmentos a S3
-        segments = cortar_video(filepath, duration)
+        segments = cortar_video(filepath, duration, mode=mode)
         
         return render_template('segment.html', segments=segments)
 